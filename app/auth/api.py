@@ -1,114 +1,120 @@
-from fastapi import APIRouter, HTTPException, Header
-from app.auth.models import PhoneRequest, SMSRequest, PasswordRequest, LoginRequest, AuthResponse, ProfileUpdateRequest, PasswordChangeRequest
-from app.auth.service import register_user, authenticate_user, reset_password, verify_sms_code, generate_sms_code, update_user_profile, change_user_password, get_user_profile, get_current_user_from_token
+import logging
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from app.database import run_db
+from app.cache import is_not_modified, not_modified_response, set_validators
+from app.auth.models import PhoneRequest, SMSRequest, PasswordRequest, LoginRequest, RefreshRequest, AuthResponse, ProfileUpdateRequest, PasswordChangeRequest
+from app.auth.service import register_user, authenticate_user, reset_password, verify_sms_code, generate_sms_code, update_user_profile, change_user_password, get_user_profile, get_profile_validators, refresh_access_token
+from app.auth.sessions import revoke_session, revoke_user_sessions
+from app.auth.dependencies import get_current_user
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 @router.post("/request-code", response_model=AuthResponse)
 async def request_sms_code(request: PhoneRequest):
     try:
-        print(f"Requesting SMS code for phone: {request.phone}")
-        code = generate_sms_code(request.phone)
-        print(f"SMS code generated: {code}")
+        generate_sms_code(request.phone)
         return AuthResponse(success=True, message="SMS code sent successfully")
     except Exception as e:
-        print(f"Error requesting SMS code: {str(e)}")
+        logger.exception("Failed to send SMS code")
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/verify-code", response_model=AuthResponse)
 async def verify_sms_code_endpoint(request: SMSRequest):
-    print(f"Verifying SMS code for phone: {request.phone}, code: {request.code}")
     if verify_sms_code(request.phone, request.code):
-        print(f"SMS code verified successfully for: {request.phone}")
         return AuthResponse(success=True, message="Code verified successfully")
     else:
-        print(f"Invalid SMS code for: {request.phone}")
         raise HTTPException(status_code=400, detail="Invalid SMS code")
 
 @router.post("/register", response_model=AuthResponse)
 async def register(request: PasswordRequest):
     try:
-        print(f"Registering user with phone: {request.phone}, name: {request.name}, city: {request.city}")
-        result = register_user(request.phone, request.password, request.name, request.city)
-        print(f"Registration result: {result}")
+        result = await register_user(request.phone, request.password, request.name, request.city)
         return AuthResponse(**result)
     except ValueError as e:
-        print(f"Registration error: {str(e)}")
+        logger.debug("Registration rejected: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/login", response_model=AuthResponse)
 async def login(request: LoginRequest):
     try:
-        print(f"Login attempt for phone: {request.phone}")
-        result = authenticate_user(request.phone, request.password)
-        print(f"Authentication result: {result}")
+        result = await authenticate_user(request.phone, request.password)
         if result:
-            print(f"Returning successful response with token: {result.get('token', 'No token')[:20] if result.get('token') else 'No token'}...")
             return AuthResponse(**result)
         else:
-            print("Authentication failed - no result returned")
             raise HTTPException(status_code=401, detail="Invalid credentials")
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Login error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Login failed")
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.post("/refresh", response_model=AuthResponse)
+async def refresh(request: RefreshRequest):
+    """Обновить access-токен по refresh-токену (refresh-токен при этом меняется)"""
+    try:
+        result = await run_db(refresh_access_token, request.refresh_token)
+        return AuthResponse(**result)
+    except ValueError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+@router.post("/logout", response_model=AuthResponse)
+async def logout(user: dict = Depends(get_current_user)):
+    """Выйти: отозвать текущую сессию (access- и refresh-токен)"""
+    if user.get('session_id'):
+        await run_db(revoke_session, user['session_id'], user['id'])
+    return AuthResponse(success=True, message="Logged out")
+
+@router.post("/logout-all", response_model=AuthResponse)
+async def logout_all(user: dict = Depends(get_current_user)):
+    """Выйти на всех устройствах: отозвать все сессии пользователя"""
+    revoked = await run_db(revoke_user_sessions, user['id'])
+    return AuthResponse(success=True, message=f"Revoked {revoked} sessions")
+
 @router.post("/reset-password", response_model=AuthResponse)
 async def reset_password_endpoint(request: PasswordRequest):
     try:
-        print(f"Resetting password for phone: {request.phone}")
-        result = reset_password(request.phone, request.password)
-        print(f"Password reset result: {result}")
+        result = await reset_password(request.phone, request.password)
         return AuthResponse(**result)
     except ValueError as e:
-        print(f"Password reset error: {str(e)}")
+        logger.debug("Password reset rejected: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/profile", response_model=dict)
-async def get_profile(authorization: str = Header(None)):
+async def get_profile(request: Request, response: Response, user: dict = Depends(get_current_user)):
     """Получить профиль текущего пользователя"""
     try:
-        if not authorization or not authorization.startswith("Bearer "):
-            raise HTTPException(status_code=401, detail="Invalid authorization header")
-        
-        token = authorization.replace("Bearer ", "")
-        user = get_current_user_from_token(token)
-        if not user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
         user_id = user['id']
-        profile = get_user_profile(user_id)
+        validators = await run_db(get_profile_validators, user_id)
+        if validators:
+            etag, last_modified = validators
+            if is_not_modified(request, etag, last_modified):
+                return not_modified_response(etag, last_modified, private=True)
+        profile = await run_db(get_user_profile, user_id)
+        if validators:
+            set_validators(response, etag, last_modified, private=True)
         return profile
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error getting profile: {str(e)}")
+        logger.exception("Failed to get profile")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/profile", response_model=dict)
 async def update_profile(
     profile_data: ProfileUpdateRequest, 
-    authorization: str = Header(None)
+    user: dict = Depends(get_current_user)
 ):
     """Обновить профиль пользователя"""
     try:
-        if not authorization or not authorization.startswith("Bearer "):
-            raise HTTPException(status_code=401, detail="Invalid authorization header")
-        
-        token = authorization.replace("Bearer ", "")
-        user = get_current_user_from_token(token)
-        if not user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
         user_id = user['id']
         
         # Преобразуем Pydantic модель в словарь
         profile_dict = profile_data.model_dump(exclude_unset=True)
         
         # Обновляем профиль
-        updated_profile = update_user_profile(user_id, profile_dict)
+        updated_profile = await run_db(update_user_profile, user_id, profile_dict)
         
         return {
             "success": True,
@@ -119,28 +125,21 @@ async def update_profile(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error updating profile: {str(e)}")
+        logger.exception("Failed to update profile")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/change-password", response_model=AuthResponse)
 async def change_password(
     password_data: PasswordChangeRequest,
-    authorization: str = Header(None)
+    user: dict = Depends(get_current_user)
 ):
     """Изменить пароль пользователя"""
     try:
-        if not authorization or not authorization.startswith("Bearer "):
-            raise HTTPException(status_code=401, detail="Invalid authorization header")
-        
-        token = authorization.replace("Bearer ", "")
-        user = get_current_user_from_token(token)
-        if not user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
         user_id = user['id']
         
         # Изменяем пароль
-        change_user_password(user_id, password_data.current_password, password_data.new_password)
+        await change_user_password(user_id, password_data.current_password, password_data.new_password,
+                                   user.get('session_id'))
         
         return AuthResponse(
             success=True,
@@ -152,5 +151,5 @@ async def change_password(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error changing password: {str(e)}")
+        logger.exception("Failed to change password")
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,35 @@
+from typing import Optional
+from fastapi import Header, HTTPException
+from app.database import run_db
+from app.auth.service import get_cached_user, load_user_from_token
+
+def _bearer_token(authorization: Optional[str]) -> Optional[str]:
+    """Извлечь токен из заголовка Authorization: Bearer <token>"""
+    if not authorization or not authorization.startswith("Bearer "):
+        return None
+    return authorization[len("Bearer "):]
+
+async def _resolve_user(token: str) -> Optional[dict]:
+    # Горячий путь - поиск в словаре без перехода в пул потоков БД
+    user = get_cached_user(token)
+    if user:
+        return user
+    return await run_db(load_user_from_token, token)
+
+async def get_current_user(authorization: str = Header(None)) -> dict:
+    """Зависимость FastAPI: текущий пользователь или 401"""
+    token = _bearer_token(authorization)
+    if not token:
+        raise HTTPException(status_code=401, detail="Invalid authorization header")
+
+    user = await _resolve_user(token)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return user
+
+async def get_optional_user(authorization: str = Header(None)) -> Optional[dict]:
+    """Зависимость FastAPI: текущий пользователь или None для анонимных запросов"""
+    token = _bearer_token(authorization)
+    if not token:
+        return None
+    return await _resolve_user(token)
@@ -0,0 +1,70 @@
+import os
+import threading
+from typing import Optional, Tuple
+from passlib.context import CryptContext
+from app.database import DBExecutor
+
+# bcrypt намеренно медленный, поэтому хеширование идет в отдельном пуле потоков
+# (bcrypt отпускает GIL) и не занимает ни event loop, ни потоки БД
+HASH_WORKERS = int(os.getenv("ULE_HASH_WORKERS", "2"))
+BCRYPT_ROUNDS = int(os.getenv("ULE_BCRYPT_ROUNDS", "12"))
+
+# Старые пароли хранились как несоленый SHA-256 (hex) - они проверяются,
+# но помечены устаревшими и перехешируются при успешном входе.
+# min_rounds: при увеличении стоимости старые bcrypt-хеши тоже обновятся
+pwd_context = CryptContext(
+    schemes=["bcrypt", "hex_sha256"],
+    deprecated=["hex_sha256"],
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+)
+
+hash_executor = DBExecutor(HASH_WORKERS, thread_name_prefix="hash")
+
+_rehash_lock = threading.Lock()
+_rehash_count = 0
+
+def hash_password(password: str) -> str:
+    """Хеш пароля текущей схемой (синхронно)"""
+    return pwd_context.hash(password)
+
+def verify_password(password: str, hashed: str) -> bool:
+    """Проверить пароль против хеша любой поддерживаемой схемы (синхронно)"""
+    try:
+        return pwd_context.verify(password, hashed)
+    except ValueError:
+        # Хеш неизвестного формата
+        return False
+
+def verify_and_update(password: str, hashed: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """Проверить пароль; вернуть новый хеш, если старый устарел"""
+    global _rehash_count
+    if not hashed:
+        # Тратим столько же времени, сколько на настоящую проверку,
+        # чтобы по времени ответа нельзя было узнать, есть ли пользователь
+        pwd_context.dummy_verify()
+        return False, None
+    try:
+        valid, new_hash = pwd_context.verify_and_update(password, hashed)
+    except ValueError:
+        return False, None
+    if new_hash:
+        with _rehash_lock:
+            _rehash_count += 1
+    return valid, new_hash
+
+async def hash_password_async(password: str) -> str:
+    """Хеш пароля в пуле хеширования"""
+    return await hash_executor.run(hash_password, password)
+
+async def verify_password_async(password: str, hashed: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """verify_and_update в пуле хеширования"""
+    return await hash_executor.run(verify_and_update, password, hashed)
+
+def get_hashing_stats() -> dict:
+    """Задержка и глубина очереди хеширования для /health/stats"""
+    stats = hash_executor.stats()
+    stats["scheme"] = pwd_context.default_scheme()
+    stats["rounds"] = BCRYPT_ROUNDS
+    stats["rehashed"] = _rehash_count
+    return stats
@@ -43,7 +43,11 @@ class PasswordChangeRequest(BaseModel):
     current_password: str = Field(..., min_length=6, description="Current password")
     new_password: str = Field(..., min_length=6, description="New password")
 
+class RefreshRequest(BaseModel):
+    refresh_token: str = Field(..., min_length=1, description="Refresh token")
+
 class AuthResponse(BaseModel):
     success: bool
     message: str
     token: Optional[str] = None
+    refresh_token: Optional[str] = None
@@ -0,0 +1,161 @@
+import os
+import math
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import Iterable, Optional
+from app.database import get_db, run_db
+
+logger = logging.getLogger(__name__)
+
+# Отзыв хранится, пока могут жить access-токены отозванной сессии
+# (должно быть больше ACCESS_TOKEN_EXPIRE_MINUTES)
+REVOCATION_TTL_MINUTES = int(os.getenv("ULE_REVOCATION_TTL_MINUTES", "60"))
+# Как часто подтягивать отзывы, сделанные другими воркерами
+REVOCATION_SYNC_INTERVAL = float(os.getenv("ULE_REVOCATION_SYNC_INTERVAL", "5"))
+# Как часто удалять истекшие отзывы и пересобирать фильтр
+REVOCATION_REBUILD_INTERVAL = float(os.getenv("ULE_REVOCATION_REBUILD_INTERVAL", "3600"))
+BLOOM_CAPACITY = int(os.getenv("ULE_REVOCATION_BLOOM_CAPACITY", "100000"))
+BLOOM_ERROR_RATE = 0.01
+
+class BloomFilter:
+    """Фильтр Блума: "точно нет" или "возможно есть" за несколько проб битов"""
+
+    def __init__(self, capacity: int, error_rate: float = BLOOM_ERROR_RATE):
+        self.capacity = max(1, capacity)
+        self.size = max(64, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        # Двойное хеширование: k позиций из одного дайджеста
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+class RevocationList:
+    """Отозванные сессии в памяти процесса: фильтр Блума + точное множество.
+
+    Для неотозванного токена (обычный случай) проверка заканчивается на
+    фильтре; точное множество отсекает ложные срабатывания фильтра.
+    """
+
+    def __init__(self, capacity: int = BLOOM_CAPACITY):
+        self._lock = threading.Lock()
+        self._bloom = BloomFilter(capacity)
+        self._revoked = set()
+        self.last_id = 0
+        self._stats = {"checks": 0, "bloom_negative": 0, "false_positive": 0, "revoked_hits": 0}
+
+    def add(self, session_ids: Iterable[str], last_id: int = None):
+        with self._lock:
+            for session_id in session_ids:
+                if session_id in self._revoked:
+                    continue
+                self._revoked.add(session_id)
+                self._bloom.add(session_id)
+            if last_id is not None:
+                self.last_id = max(self.last_id, last_id)
+            if len(self._revoked) > self._bloom.capacity:
+                # Фильтр переполнен - ложных срабатываний станет слишком много
+                self._rebuild_locked(self._revoked, self._bloom.capacity * 2)
+
+    def rebuild(self, session_ids: Iterable[str], last_id: int):
+        with self._lock:
+            revoked = set(session_ids)
+            self._rebuild_locked(revoked, max(BLOOM_CAPACITY, len(revoked) * 2))
+            self.last_id = last_id
+
+    def _rebuild_locked(self, revoked: set, capacity: int):
+        bloom = BloomFilter(capacity)
+        for session_id in revoked:
+            bloom.add(session_id)
+        self._bloom, self._revoked = bloom, set(revoked)
+
+    def is_revoked(self, session_id: Optional[str]) -> bool:
+        if not session_id:
+            return False
+        self._stats["checks"] += 1
+        if session_id not in self._bloom:
+            self._stats["bloom_negative"] += 1
+            return False
+        if session_id in self._revoked:
+            self._stats["revoked_hits"] += 1
+            return True
+        self._stats["false_positive"] += 1
+        return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"revoked": len(self._revoked), "bloom_bits": self._bloom.size,
+                    "bloom_hashes": self._bloom.hashes, "last_id": self.last_id, **self._stats}
+
+revocation_list = RevocationList()
+
+def is_session_revoked(session_id: Optional[str]) -> bool:
+    """Отозвана ли сессия, к которой привязан токен (без обращения к БД)"""
+    return revocation_list.is_revoked(session_id)
+
+def record_revocations(cursor, session_ids: list):
+    """Записать отзывы в БД в текущей транзакции; после commit вызвать revocation_list.add"""
+    if not session_ids:
+        return
+    cursor.executemany(
+        "INSERT INTO revoked_sessions (session_id, expires_at) VALUES (?, datetime('now', ?))",
+        [(session_id, f"+{REVOCATION_TTL_MINUTES} minutes") for session_id in session_ids],
+    )
+
+def load_revocations():
+    """Удалить истекшие отзывы и пересобрать фильтр из таблицы (при старте и периодически)"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM revoked_sessions WHERE expires_at <= datetime('now')")
+        conn.commit()
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM revoked_sessions")
+        last_id = cursor.fetchone()[0]
+        cursor.execute("SELECT session_id FROM revoked_sessions WHERE id <= ?", (last_id,))
+        revocation_list.rebuild((row[0] for row in cursor.fetchall()), last_id)
+    # Отзывы, записанные во время пересборки
+    sync_revocations()
+    logger.info("Revocation list loaded", extra={"revoked": revocation_list.stats()["revoked"]})
+
+def sync_revocations() -> int:
+    """Подтянуть отзывы, записанные после последней синхронизации (в т.ч. другими воркерами)"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id, session_id FROM revoked_sessions WHERE id > ? ORDER BY id",
+            (revocation_list.last_id,),
+        )
+        rows = cursor.fetchall()
+    if rows:
+        revocation_list.add((row[1] for row in rows), rows[-1][0])
+    return len(rows)
+
+async def revocation_sync_loop():
+    """Фоновая задача: синхронизация отзывов между воркерами"""
+    loop = asyncio.get_running_loop()
+    last_rebuild = loop.time()
+    while True:
+        await asyncio.sleep(REVOCATION_SYNC_INTERVAL)
+        try:
+            if loop.time() - last_rebuild >= REVOCATION_REBUILD_INTERVAL:
+                await run_db(load_revocations)
+                last_rebuild = loop.time()
+            else:
+                await run_db(sync_revocations)
+        except Exception:
+            logger.exception("Revocation sync failed")
+
+def get_revocation_stats() -> dict:
+    return revocation_list.stats()
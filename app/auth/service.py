@@ -1,18 +1,36 @@
 import re
+import logging
+import os
+import time
+import threading
+from collections import OrderedDict
 from typing import Dict, Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from jose import jwt
-import hashlib
-from app.database import get_db
+from app.database import get_db, run_db
+from app.cache import make_etag, parse_db_timestamp
+from app.auth.hashing import hash_password_async, verify_password_async
+from app.auth.sessions import create_session, rotate_session, revoke_user_sessions
+from app.auth.revocation import is_session_revoked
+from app.logging_config import HOT_PATH_SAMPLE
+
+logger = logging.getLogger(__name__)
 
 SECRET_KEY = "your-secret-key-here"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Кеш "токен -> пользователь": повторные запросы с тем же токеном не ходят в БД
+TOKEN_CACHE_TTL = int(os.getenv("ULE_TOKEN_CACHE_TTL", "300"))
+TOKEN_CACHE_SIZE = int(os.getenv("ULE_TOKEN_CACHE_SIZE", "10000"))
+
+_token_cache = OrderedDict()
+_token_cache_lock = threading.Lock()
+_token_cache_generation = 0
+_token_cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
 def format_russian_phone(phone: str) -> str:
-    print(f"Formatting phone: {phone}")
     digits = re.sub(r'\D', '', phone)
-    print(f"Extracted digits: {digits}")
 
     if digits.startswith('7'):
         digits = '+' + digits
@@ -21,146 +39,172 @@ def format_russian_phone(phone: str) -> str:
 
     if len(digits) == 12:
         formatted = f"+7 ({digits[2:5]}) {digits[5:8]}-{digits[8:10]}-{digits[10:12]}"
-        print(f"Formatted result: {formatted}")
         return formatted
-    print(f"Returning original: {phone}")
     return phone
 
-def hash_password(password: str) -> str:
-    hashed = hashlib.sha256(password.encode()).hexdigest()
-    print(f"Password hashed successfully, length: {len(hashed)}")
-    return hashed
-
-def verify_password(password: str, hashed: str) -> bool:
-    result = hash_password(password) == hashed
-    print(f"Password verification result: {result}")
-    return result
-
 def generate_sms_code(phone: str) -> str:
-    print(f"Generating SMS code for phone: {phone}")
+    logger.debug("SMS code requested")
     return "1111"
 
 def verify_sms_code(phone: str, code: str) -> bool:
     result = code == "1111"
-    print(f"SMS code verification for phone {phone}: {code} == '1111' = {result}")
+    logger.debug("SMS code verification result: %s", result)
     return result
 
 def create_access_token(data: dict) -> str:
     try:
         to_encode = data.copy()
-        expire = datetime.now() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        # jose считает наивное время UTC, поэтому берем время в UTC явно
+        expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         to_encode.update({"exp": expire})
-        print(f"Creating JWT token for data: {to_encode}")
         encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-        print(f"JWT token created successfully")
         return encoded_jwt
     except Exception as e:
-        print(f"Error creating JWT token: {str(e)}")
+        logger.exception("Failed to create access token")
         raise e
 
-def register_user(phone: str, password: str, name: str = None, city: str = None) -> dict:
-    print(f"Registering user with phone: {phone}, name: {name}, city: {city}")
-    formatted_phone = format_russian_phone(phone)
-    print(f"Formatted phone for registration: {formatted_phone}")
-
+def _insert_user(formatted_phone: str, password_hash: str, name: str = None, city: str = None) -> int:
     with get_db() as conn:
         cursor = conn.cursor()
         
         # Проверяем, существует ли пользователь
         cursor.execute("SELECT id FROM users WHERE phone = ?", (formatted_phone,))
         if cursor.fetchone():
-            print(f"User already exists: {formatted_phone}")
+            logger.debug("Registration rejected: user already exists")
             raise ValueError("User already exists")
 
         # Создаем нового пользователя
         cursor.execute("""
             INSERT INTO users (phone, password_hash, name, city, role, created_at, updated_at)
             VALUES (?, ?, ?, ?, 'customer', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-        """, (formatted_phone, hash_password(password), name, city))
+        """, (formatted_phone, password_hash, name, city))
         
         user_id = cursor.lastrowid
         conn.commit()
-        
-        print(f"User registered successfully: {formatted_phone}")
-        print(f"User ID: {user_id}")
+        return user_id
 
-    return {"success": True, "message": "User registered successfully"}
-
-def authenticate_user(phone: str, password: str) -> Optional[dict]:
-    print(f"Authenticating user with phone: {phone}")
+async def register_user(phone: str, password: str, name: str = None, city: str = None) -> dict:
     formatted_phone = format_russian_phone(phone)
-    print(f"Formatted phone: {formatted_phone}")
 
+    # Хешируем до обращения к БД, чтобы не держать соединение во время bcrypt
+    password_hash = await hash_password_async(password)
+    user_id = await run_db(_insert_user, formatted_phone, password_hash, name, city)
+    
+    logger.info("User registered", extra={"user_id": user_id})
+
+    return {"success": True, "message": "User registered successfully"}
+
+def _get_credentials(formatted_phone: str):
     with get_db() as conn:
         cursor = conn.cursor()
-        
-        # Ищем пользователя в базе данных
         cursor.execute("SELECT id, password_hash, name, city, role FROM users WHERE phone = ?", (formatted_phone,))
-        user_data = cursor.fetchone()
-        
-        if not user_data:
-            print(f"User not found: {formatted_phone}")
-            return None
-
-        user_id, password_hash, name, city, role = user_data
-        
-        if not verify_password(password, password_hash):
-            print(f"Password verification failed for: {formatted_phone}")
-            return None
+        return cursor.fetchone()
 
-        token = create_access_token({"sub": formatted_phone})
-        print(f"Login successful for: {formatted_phone}")
-        return {
-            "success": True,
-            "message": "Login successful",
-            "token": token,
-            "user": {
-                "id": user_id,
-                "phone": formatted_phone,
-                "name": name,
-                "city": city,
-                "role": role,
-                "avatar": None
-            }
-        }
+def _update_password_hash(user_id: int, old_hash: str, new_hash: str):
+    """Заменить хеш, только если пароль не успели сменить параллельно"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?",
+            (new_hash, user_id, old_hash),
+        )
+        conn.commit()
 
-def reset_password(phone: str, new_password: str) -> dict:
-    print(f"Resetting password for phone: {phone}")
+async def authenticate_user(phone: str, password: str) -> Optional[dict]:
     formatted_phone = format_russian_phone(phone)
-    print(f"Formatted phone for reset: {formatted_phone}")
 
+    # Ищем пользователя в базе данных
+    user_data = await run_db(_get_credentials, formatted_phone)
+    
+    valid, new_hash = await verify_password_async(password, user_data[1] if user_data else None)
+    if not user_data:
+        logger.debug("Login failed: unknown phone")
+        return None
+
+    user_id, password_hash, name, city, role = user_data
+    
+    if not valid:
+        logger.info("Login failed: wrong password", extra={"user_id": user_id})
+        return None
+    
+    if new_hash:
+        # Устаревший хеш (SHA-256 или меньшая стоимость bcrypt) - обновляем
+        await run_db(_update_password_hash, user_id, password_hash, new_hash)
+        logger.info("Password hash upgraded", extra={"user_id": user_id})
+
+    session_id, refresh_token = await run_db(create_session, user_id)
+    token = create_access_token({"sub": formatted_phone, "sid": session_id})
+    logger.debug("Login successful", extra={"user_id": user_id})
+    return {
+        "success": True,
+        "message": "Login successful",
+        "token": token,
+        "refresh_token": refresh_token,
+        "user": {
+            "id": user_id,
+            "phone": formatted_phone,
+            "name": name,
+            "city": city,
+            "role": role,
+            "avatar": None
+        }
+    }
+
+def _reset_password_hash(formatted_phone: str, password_hash: str):
     with get_db() as conn:
         cursor = conn.cursor()
         
         # Ищем пользователя в базе данных
         cursor.execute("SELECT id FROM users WHERE phone = ?", (formatted_phone,))
-        if not cursor.fetchone():
-            print(f"User not found for password reset: {formatted_phone}")
+        user_row = cursor.fetchone()
+        if not user_row:
+            logger.debug("Password reset rejected: unknown phone")
             raise ValueError("User not found")
 
         # Обновляем пароль
         cursor.execute("""
             UPDATE users 
             SET password_hash = ?, updated_at = CURRENT_TIMESTAMP 
-            WHERE phone = ?
-        """, (hash_password(new_password), formatted_phone))
+            WHERE id = ?
+        """, (password_hash, user_row[0]))
         
         conn.commit()
-        
-        print(f"Password reset successfully for: {formatted_phone}")
-        return {"success": True, "message": "Password reset successfully"}
+        invalidate_user_cache(user_row[0])
+        logger.info("Password reset", extra={"user_id": user_row[0]})
+        return user_row[0]
+
+async def reset_password(phone: str, new_password: str) -> dict:
+    formatted_phone = format_russian_phone(phone)
+
+    password_hash = await hash_password_async(new_password)
+    user_id = await run_db(_reset_password_hash, formatted_phone, password_hash)
+    # Пароль сброшен - выходим на всех устройствах
+    await run_db(revoke_user_sessions, user_id)
+    
+    return {"success": True, "message": "Password reset successfully"}
+
+def refresh_access_token(refresh_token: str) -> dict:
+    """Новая пара токенов по refresh-токену (без проверки пароля)"""
+    session = rotate_session(refresh_token)
+    if not session:
+        raise ValueError("Invalid refresh token")
+    
+    token = create_access_token({"sub": session["phone"], "sid": session["session_id"]})
+    return {
+        "success": True,
+        "message": "Token refreshed",
+        "token": token,
+        "refresh_token": session["refresh_token"]
+    }
 
 def get_user_by_phone(phone: str):
     """Получить пользователя по номеру телефона"""
-    print(f"Getting user by phone: {phone}")
     formatted_phone = format_russian_phone(phone)
-    print(f"Formatted phone: {formatted_phone}")
     
     with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT id, phone, name, city, role FROM users WHERE phone = ?", (formatted_phone,))
         user_data = cursor.fetchone()
-        print(f"Database result: {user_data}")
         
         if user_data:
             user_dict = {
@@ -170,9 +214,7 @@ def get_user_by_phone(phone: str):
                 'city': user_data[3],
                 'role': user_data[4]
             }
-            print(f"Returning user: {user_dict}")
             return user_dict
-        print("No user found")
         return None
 
 def update_user_profile(user_id: int, **kwargs) -> dict:
@@ -205,44 +247,110 @@ def update_user_profile(user_id: int, **kwargs) -> dict:
         sql = f"UPDATE users SET {', '.join(update_fields)} WHERE id = ?"
         cursor.execute(sql, values)
         conn.commit()
+        invalidate_user_cache(user_id)
         
         return {"success": True, "message": "Profile updated successfully"}
 
+def get_cached_user(token: str) -> Optional[dict]:
+    """Пользователь из кеша токенов или None (без обращения к БД)"""
+    user = _lookup_cached_user(token)
+    logger.debug("Token cache %s", "hit" if user else "miss", extra={"sample": HOT_PATH_SAMPLE})
+    return user
+
+def _lookup_cached_user(token: str) -> Optional[dict]:
+    now = time.monotonic()
+    with _token_cache_lock:
+        entry = _token_cache.get(token)
+        if entry is None:
+            _token_cache_stats["misses"] += 1
+            return None
+        expires_at, user = entry
+        if expires_at <= now:
+            del _token_cache[token]
+            _token_cache_stats["misses"] += 1
+            return None
+        if is_session_revoked(user.get('session_id')):
+            del _token_cache[token]
+            _token_cache_stats["misses"] += 1
+            return None
+        _token_cache.move_to_end(token)
+        _token_cache_stats["hits"] += 1
+        return dict(user)
+
+def _cache_user(token: str, user: dict, token_exp, generation: int):
+    """Положить пользователя в кеш, если за время запроса его не инвалидировали"""
+    ttl = TOKEN_CACHE_TTL
+    if token_exp is not None:
+        ttl = min(ttl, token_exp - time.time())
+    if ttl <= 0 or TOKEN_CACHE_SIZE <= 0:
+        return
+    with _token_cache_lock:
+        if generation != _token_cache_generation:
+            return
+        _token_cache[token] = (time.monotonic() + ttl, dict(user))
+        _token_cache.move_to_end(token)
+        while len(_token_cache) > TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+            _token_cache_stats["evictions"] += 1
+
+def invalidate_user_cache(user_id: int = None):
+    """Удалить из кеша токены пользователя (без user_id - весь кеш)"""
+    global _token_cache_generation
+    with _token_cache_lock:
+        _token_cache_generation += 1
+        _token_cache_stats["invalidations"] += 1
+        if user_id is None:
+            _token_cache.clear()
+            return
+        stale = [token for token, (_, user) in _token_cache.items() if user['id'] == user_id]
+        for token in stale:
+            del _token_cache[token]
+
+def get_token_cache_stats() -> dict:
+    """Статистика кеша токенов для /health/stats"""
+    with _token_cache_lock:
+        return {"size": len(_token_cache), "max_size": TOKEN_CACHE_SIZE,
+                "ttl": TOKEN_CACHE_TTL, **_token_cache_stats}
+
 def get_current_user_from_token(token: str):
     """Получить пользователя из JWT токена"""
+    return get_cached_user(token) or load_user_from_token(token)
+
+def load_user_from_token(token: str):
+    """Декодировать токен, найти пользователя в БД и положить его в кеш"""
     try:
-        print(f"Decoding token: {token[:20]}...")
+        generation = _token_cache_generation
         # Декодируем токен
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        print(f"Token payload: {payload}")
         phone = payload.get("sub")
-        print(f"Extracted phone: {phone}")
         
         if phone is None:
-            print("No phone in token payload")
+            logger.debug("Token without subject")
+            return None
+        
+        if is_session_revoked(payload.get("sid")):
+            logger.debug("Token of a revoked session")
             return None
             
         # Получаем пользователя по номеру телефона
         user = get_user_by_phone(phone)
-        print(f"User from phone: {user}")
+        if user:
+            user['session_id'] = payload.get("sid")
+            _cache_user(token, user, payload.get("exp"), generation)
         return user
     except jwt.ExpiredSignatureError:
-        print("Token expired")
+        logger.debug("Token expired")
         return None
     except jwt.JWTError as e:
-        print(f"Invalid token: {e}")
+        logger.debug("Invalid token: %s", e)
         return None
-    except Exception as e:
-        print(f"Error decoding token: {str(e)}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Failed to resolve user from token")
         return None
 
 def update_user_profile(user_id: int, profile_data: dict) -> dict:
     """Обновляет профиль пользователя в базе данных"""
     try:
-        print(f"Updating profile for user {user_id} with data: {profile_data}")
-        
         with get_db() as conn:
             cursor = conn.cursor()
             
@@ -276,8 +384,9 @@ def update_user_profile(user_id: int, profile_data: dict) -> dict:
             """, (new_name, new_city, user_id))
             
             conn.commit()
+            invalidate_user_cache(user_id)
             
-            print(f"Profile updated successfully for user {user_id}")
+            logger.debug("Profile updated", extra={"user_id": user_id})
             
             # Возвращаем обновленные данные
             return {
@@ -291,54 +400,67 @@ def update_user_profile(user_id: int, profile_data: dict) -> dict:
             }
             
     except Exception as e:
-        print(f"Error updating profile: {str(e)}")
+        logger.debug("Profile update failed for user %s: %s", user_id, e)
         raise e
 
-def change_user_password(user_id: int, current_password: str, new_password: str) -> bool:
-    """Изменяет пароль пользователя"""
+def _get_password_hash(user_id: int) -> str:
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT password_hash FROM users WHERE id = ?", (user_id,))
+        result = cursor.fetchone()
+        if not result:
+            raise ValueError("User not found")
+        return result[0]
+
+def _set_password_hash(user_id: int, password_hash: str):
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE users 
+            SET password_hash = ?, updated_at = datetime('now')
+            WHERE id = ?
+        """, (password_hash, user_id))
+        conn.commit()
+        invalidate_user_cache(user_id)
+
+async def change_user_password(user_id: int, current_password: str, new_password: str,
+                               session_id: str = None) -> bool:
+    """Изменяет пароль пользователя (остальные сессии, кроме текущей, отзываются)"""
     try:
-        print(f"Changing password for user {user_id}")
+        # Получаем текущий хешированный пароль
+        current_hashed = await run_db(_get_password_hash, user_id)
         
-        with get_db() as conn:
-            cursor = conn.cursor()
-            
-            # Получаем текущий хешированный пароль
-            cursor.execute("SELECT password FROM users WHERE id = ?", (user_id,))
-            result = cursor.fetchone()
-            
-            if not result:
-                raise ValueError("User not found")
-            
-            current_hashed = result[0]
-            
-            # Проверяем текущий пароль
-            if not verify_password(current_password, current_hashed):
-                raise ValueError("Current password is incorrect")
-            
-            # Хешируем новый пароль
-            new_hashed = hash_password(new_password)
-            
-            # Обновляем пароль в базе данных
-            cursor.execute("""
-                UPDATE users 
-                SET password = ?, updated_at = datetime('now')
-                WHERE id = ?
-            """, (new_hashed, user_id))
-            
-            conn.commit()
-            
-            print(f"Password changed successfully for user {user_id}")
-            return True
+        # Проверяем текущий пароль
+        valid, _ = await verify_password_async(current_password, current_hashed)
+        if not valid:
+            raise ValueError("Current password is incorrect")
+        
+        # Хешируем и сохраняем новый пароль
+        new_hashed = await hash_password_async(new_password)
+        await run_db(_set_password_hash, user_id, new_hashed)
+        await run_db(revoke_user_sessions, user_id, session_id)
+        
+        logger.info("Password changed", extra={"user_id": user_id})
+        return True
             
     except Exception as e:
-        print(f"Error changing password: {str(e)}")
+        logger.debug("Password change failed for user %s: %s", user_id, e)
         raise e
 
+def get_profile_validators(user_id: int) -> Optional[tuple]:
+    """ETag и Last-Modified профиля: ETag из полей профиля, а не из
+    updated_at, чтобы две правки в одну секунду не дали одинаковый ETag"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT phone, name, city, role, updated_at FROM users WHERE id = ?", (user_id,))
+        row = cursor.fetchone()
+    if not row:
+        return None
+    return make_etag("profile", user_id, row[:4]), parse_db_timestamp(row[4])
+
 def get_user_profile(user_id: int) -> dict:
     """Получает полный профиль пользователя"""
     try:
-        print(f"Getting profile for user {user_id}")
-        
         with get_db() as conn:
             cursor = conn.cursor()
             
@@ -366,9 +488,8 @@ def get_user_profile(user_id: int) -> dict:
                 'email': ''  # Email пока не хранится в БД
             }
             
-            print(f"Profile retrieved: {profile}")
             return profile
             
     except Exception as e:
-        print(f"Error getting profile: {str(e)}")
+        logger.debug("Profile lookup failed for user %s: %s", user_id, e)
         raise e
\ No newline at end of file
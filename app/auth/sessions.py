@@ -0,0 +1,156 @@
+import os
+import uuid
+import hashlib
+import logging
+import secrets
+from typing import Optional, Tuple
+from app.database import get_db
+from app.auth.revocation import record_revocations, revocation_list
+
+logger = logging.getLogger(__name__)
+
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("ULE_REFRESH_TOKEN_DAYS", "30"))
+# Сколько секунд после ротации принимается предыдущий refresh-токен: вкладки
+# одного браузера делят токен и могут обновить его одновременно
+REFRESH_REUSE_GRACE_SECONDS = int(os.getenv("ULE_REFRESH_REUSE_GRACE", "60"))
+
+def _hash_secret(secret: str) -> str:
+    # Секрет - 256 случайных бит, поэтому медленный KDF здесь не нужен
+    return hashlib.sha256(secret.encode()).hexdigest()
+
+def _split_token(refresh_token: str) -> Optional[Tuple[str, str]]:
+    """Refresh-токен имеет вид <id сессии>.<секрет>"""
+    session_id, _, secret = refresh_token.partition(".")
+    if not session_id or not secret:
+        return None
+    return session_id, secret
+
+def create_session(user_id: int) -> Tuple[str, str]:
+    """Открыть сессию, вернуть (id сессии, refresh-токен)"""
+    session_id = uuid.uuid4().hex
+    secret = secrets.token_urlsafe(32)
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO sessions (id, user_id, refresh_hash, expires_at)
+            VALUES (?, ?, ?, datetime('now', ?))
+        """, (session_id, user_id, _hash_secret(secret), f"+{REFRESH_TOKEN_EXPIRE_DAYS} days"))
+        conn.commit()
+
+    return session_id, f"{session_id}.{secret}"
+
+def rotate_session(refresh_token: str) -> Optional[dict]:
+    """Проверить refresh-токен и заменить его новым.
+
+    Возвращает {session_id, user_id, phone, refresh_token} или None.
+    Предыдущий токен в течение REFRESH_REUSE_GRACE_SECONDS после ротации
+    открывает дочернюю сессию со своим токеном (параллельно обновившиеся
+    вкладки не выбивают друг друга; в БД хранятся только хеши). Более
+    позднее предъявление уже замененного токена означает, что он утек:
+    сессия отзывается вместе с дочерними.
+    """
+    parts = _split_token(refresh_token)
+    if not parts:
+        return None
+    session_id, secret = parts
+    new_secret = secrets.token_urlsafe(32)
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+        # Проверка и ротация одним UPDATE: два параллельных обновления
+        # одним токеном не пройдут оба
+        cursor.execute("""
+            UPDATE sessions
+            SET refresh_hash = ?, previous_hash = refresh_hash,
+                rotated_at = CURRENT_TIMESTAMP, last_used_at = CURRENT_TIMESTAMP,
+                expires_at = datetime('now', ?)
+            WHERE id = ? AND refresh_hash = ?
+              AND revoked_at IS NULL AND expires_at > datetime('now')
+            RETURNING user_id, (SELECT phone FROM users WHERE users.id = sessions.user_id)
+        """, (_hash_secret(new_secret), f"+{REFRESH_TOKEN_EXPIRE_DAYS} days", session_id, _hash_secret(secret)))
+        row = cursor.fetchone()
+
+        if row is None:
+            # Токен только что заменен другой вкладкой: открываем дочернюю
+            # сессию, токен другой вкладки остается действительным
+            cursor.execute("""
+                SELECT user_id, (SELECT phone FROM users WHERE users.id = sessions.user_id)
+                FROM sessions
+                WHERE id = ? AND previous_hash = ?
+                  AND revoked_at IS NULL AND expires_at > datetime('now')
+                  AND rotated_at > datetime('now', ?)
+            """, (session_id, _hash_secret(secret), f"-{REFRESH_REUSE_GRACE_SECONDS} seconds"))
+            recent = cursor.fetchone()
+            if recent is not None:
+                user_id, phone = recent
+                child_id = uuid.uuid4().hex
+                cursor.execute("""
+                    INSERT INTO sessions (id, user_id, refresh_hash, expires_at, parent_id)
+                    VALUES (?, ?, ?, datetime('now', ?), ?)
+                """, (child_id, user_id, _hash_secret(new_secret), f"+{REFRESH_TOKEN_EXPIRE_DAYS} days", session_id))
+                conn.commit()
+                logger.debug("Refresh token replaced concurrently, child session opened",
+                             extra={"session_id": session_id, "child_id": child_id})
+                return {
+                    "session_id": child_id,
+                    "user_id": user_id,
+                    "phone": phone,
+                    "refresh_token": f"{child_id}.{new_secret}",
+                }
+
+            cursor.execute("""
+                UPDATE sessions SET revoked_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND revoked_at IS NULL AND refresh_hash <> ?
+            """, (session_id, _hash_secret(secret)))
+            revoked = [session_id] if cursor.rowcount > 0 else []
+            if revoked:
+                # Дочерние сессии могли открыть этим же утекшим токеном
+                cursor.execute("""
+                    UPDATE sessions SET revoked_at = CURRENT_TIMESTAMP
+                    WHERE parent_id = ? AND revoked_at IS NULL
+                    RETURNING id
+                """, (session_id,))
+                revoked += [child_id for (child_id,) in cursor.fetchall()]
+                record_revocations(cursor, revoked)
+            conn.commit()
+            if revoked:
+                revocation_list.add(revoked)
+                logger.warning("Refresh token reuse detected, session revoked",
+                               extra={"session_id": session_id})
+            return None
+
+        conn.commit()
+
+    user_id, phone = row
+    return {
+        "session_id": session_id,
+        "user_id": user_id,
+        "phone": phone,
+        "refresh_token": f"{session_id}.{new_secret}",
+    }
+
+def _revoke(where: str, params: tuple) -> list:
+    """Отозвать сессии по условию; их access-токены попадают в список отзыва"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            UPDATE sessions SET revoked_at = CURRENT_TIMESTAMP
+            WHERE revoked_at IS NULL AND {where}
+            RETURNING id
+        """, params)
+        session_ids = [row[0] for row in cursor.fetchall()]
+        record_revocations(cursor, session_ids)
+        conn.commit()
+    revocation_list.add(session_ids)
+    return session_ids
+
+def revoke_session(session_id: str, user_id: int = None) -> bool:
+    """Отозвать одну сессию (при user_id - только свою)"""
+    if user_id is None:
+        return bool(_revoke("id = ?", (session_id,)))
+    return bool(_revoke("id = ? AND user_id = ?", (session_id, user_id)))
+
+def revoke_user_sessions(user_id: int, except_session_id: str = None) -> int:
+    """Отозвать все сессии пользователя, кроме указанной"""
+    return len(_revoke("user_id = ? AND id IS NOT ?", (user_id, except_session_id)))
@@ -0,0 +1,167 @@
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Callable, Hashable, Optional, Tuple
+from fastapi import Request, Response
+from app.database import get_db
+from app.logging_config import HOT_PATH_SAMPLE
+
+logger = logging.getLogger(__name__)
+
+# Размер кеша ответов: число записей и суммарный объем тел в байтах
+RESPONSE_CACHE_SIZE = int(os.getenv("ULE_RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("ULE_RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+def read_table_versions(tables: Tuple[str, ...]) -> Tuple[int, ...]:
+    """Текущие версии таблиц из table_versions.
+
+    Версию увеличивают триггеры на каждую запись в таблицу, поэтому она
+    общая для всех воркеров; чтение - поиск по первичному ключу.
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT name, version FROM table_versions WHERE name IN ({','.join('?' * len(tables))})",
+            tables,
+        )
+        versions = dict(cursor.fetchall())
+    return tuple(versions.get(table, 0) for table in tables)
+
+class VersionedCache:
+    """LRU-кеш значений, привязанных к версиям таблиц.
+
+    Запись действительна, пока версии таблиц, из которых она построена,
+    не изменились: инвалидация не нужна, устаревшая запись просто не
+    совпадет по версии и будет перезаписана.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "evictions": 0}
+
+    def get(self, key: Hashable, versions: tuple) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+            elif entry[0] != versions:
+                self._stats["stale"] += 1
+                self._stats["misses"] += 1
+                entry = None
+            else:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+        logger.debug("Response cache %s", "hit" if entry else "miss",
+                     extra={"key": key[0] if isinstance(key, tuple) and key else key, "sample": HOT_PATH_SAMPLE})
+        return entry[1] if entry else None
+
+    def put(self, key: Hashable, versions: tuple, value: Any, size: int = 0):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (versions, value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted[2]
+                self._stats["evictions"] += 1
+
+    def get_or_build(self, key: Hashable, tables: Tuple[str, ...], build: Callable[[], Any],
+                     sizeof: Callable[[Any], int] = None) -> Any:
+        """Значение из кеша или build(); вызывать в потоке БД (через run_db)"""
+        # Версии читаются до построения: если таблицы изменятся во время
+        # build, запись сохранится со старой версией и не будет использована
+        versions = read_table_versions(tables)
+        value = self.get(key, versions)
+        if value is None:
+            value = build()
+            self.put(key, versions, value, sizeof(value) if sizeof else 0)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, **self._stats}
+
+response_cache = VersionedCache()
+
+# Условные GET: ETag и Last-Modified считаются из версии строки или таблиц,
+# без загрузки и сериализации ответа
+
+def make_etag(*parts) -> str:
+    """Строгий ETag из значений, от которых зависит ответ"""
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+def parse_db_timestamp(value) -> Optional[datetime]:
+    """CURRENT_TIMESTAMP SQLite (UTC) -> datetime с часовым поясом"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value)).replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+def usable_last_modified(last_modified: Optional[datetime]) -> Optional[datetime]:
+    """Last-Modified, если ему можно доверять.
+
+    updated_at хранится с точностью до секунды: изменение в ту же секунду
+    не меняет дату. Пока текущая секунда не закончилась, дата не
+    отдается и If-Modified-Since по ней не проверяется - остается ETag.
+    """
+    if last_modified is None:
+        return None
+    current_second = datetime.now(timezone.utc).replace(microsecond=0)
+    return last_modified if last_modified.replace(microsecond=0) < current_second else None
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime = None) -> bool:
+    """Можно ли ответить 304: If-None-Match, а без него - If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        # Для GET сравнение слабое: префикс W/ не учитывается
+        return any(tag.removeprefix("W/") == etag for tag in tags)
+    if_modified_since = request.headers.get("if-modified-since")
+    last_modified = usable_last_modified(last_modified)
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+def set_validators(response: Response, etag: str, last_modified: datetime = None, private: bool = False):
+    """Заголовки для повторной проверки: браузер пришлет If-None-Match сам"""
+    response.headers["ETag"] = etag
+    last_modified = usable_last_modified(last_modified)
+    if last_modified is not None:
+        response.headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    response.headers["Cache-Control"] = "private, no-cache" if private else "no-cache"
+
+def not_modified_response(etag: str, last_modified: datetime = None, private: bool = False) -> Response:
+    response = Response(status_code=304)
+    set_validators(response, etag, last_modified, private)
+    return response
+
+def get_response_cache_stats() -> dict:
+    return response_cache.stats()
@@ -0,0 +1,77 @@
+import os
+import asyncio
+from typing import Callable, Hashable
+from app.database import run_db
+
+# Маршруты, на которых одинаковые одновременные запросы объединяются:
+# "*" - все, пустая строка - ни одного, иначе имена через запятую
+# (например "tasks/available,tasks/facets")
+COALESCE_ROUTES = os.getenv("ULE_COALESCE_ROUTES", "*")
+
+def _route_enabled(name: str) -> bool:
+    routes = {route.strip() for route in COALESCE_ROUTES.split(",") if route.strip()}
+    return "*" in routes or name in routes
+
+class SingleFlight:
+    """Объединение одинаковых одновременных запросов к БД.
+
+    Пока вычисление по ключу выполняется, запросы с тем же ключом ждут
+    его результат, а не выполняют свою копию запроса. Результат не
+    сохраняется после завершения: следующий запрос запустит новое
+    вычисление, поэтому устаревших данных не бывает. Результат общий
+    для всех ожидающих, изменять его нельзя.
+    """
+
+    def __init__(self, name: str, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        # key -> [future, число ожидающих]
+        self._calls = {}
+        self._stats = {"calls": 0, "executions": 0, "coalesced": 0, "errors": 0, "max_waiters": 0}
+
+    async def run(self, key: Hashable, func: Callable, *args, **kwargs):
+        """Выполнить func через run_db или дождаться такого же вычисления"""
+        self._stats["calls"] += 1
+        if not self.enabled:
+            self._stats["executions"] += 1
+            return await run_db(func, *args, **kwargs)
+        call = self._calls.get(key)
+        if call is None:
+            future = asyncio.ensure_future(run_db(func, *args, **kwargs))
+            call = self._calls[key] = [future, 1]
+            future.add_done_callback(lambda done: self._finish(key, done))
+            self._stats["executions"] += 1
+        else:
+            call[1] += 1
+            self._stats["coalesced"] += 1
+            self._stats["max_waiters"] = max(self._stats["max_waiters"], call[1])
+        # shield: если клиент ведущего запроса отключился, вычисление
+        # продолжается для остальных
+        return await asyncio.shield(call[0])
+
+    def _finish(self, key: Hashable, future: asyncio.Future):
+        call = self._calls.get(key)
+        if call is not None and call[0] is future:
+            del self._calls[key]
+        # Ошибку забирают все ожидающие; чтение здесь нужно, чтобы не было
+        # предупреждения, если все они уже отменены
+        if not future.cancelled() and future.exception() is not None:
+            self._stats["errors"] += 1
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        stats["in_flight"] = len(self._calls)
+        stats["enabled"] = self.enabled
+        return stats
+
+_groups = {}
+
+def single_flight(name: str) -> SingleFlight:
+    """Группа объединения для маршрута; включена, если есть в ULE_COALESCE_ROUTES"""
+    group = _groups.get(name)
+    if group is None:
+        group = _groups[name] = SingleFlight(name, _route_enabled(name))
+    return group
+
+def get_coalesce_stats() -> dict:
+    return {name: group.stats() for name, group in _groups.items()}
@@ -1,19 +1,303 @@
 import sqlite3
 import os
+import logging
+import queue
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
+from app.logging_config import HOT_PATH_SAMPLE
+
+logger = logging.getLogger(__name__)
 
 # Путь к базе данных
 DATABASE_PATH = "ule_platform.db"
 
+# Настройки пула соединений
+POOL_SIZE = int(os.environ.get("ULE_DB_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.environ.get("ULE_DB_POOL_TIMEOUT", "10"))
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KB = 16384
+MMAP_SIZE = 128 * 1024 * 1024
+STATEMENT_CACHE_SIZE = 256
+
+# Потоков для запросов к БД столько же, сколько соединений в пуле,
+# чтобы поток никогда не ждал свободное соединение
+DB_EXECUTOR_WORKERS = POOL_SIZE
+
+
+class PoolTimeoutError(Exception):
+    """Не удалось получить соединение из пула за отведенное время"""
+
+
+class ConnectionPool:
+    """Пул заранее настроенных соединений SQLite"""
+
+    def __init__(self, path: str, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+        self._stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "connections_opened": 0,
+            "connections_discarded": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        # check_same_thread=False: соединение может вернуться в пул из другого потока
+        conn = sqlite3.connect(
+            self.path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        # Настройки соединения выполняются один раз, а не на каждый запрос
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+        started = time.monotonic()
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+                with self._lock:
+                    self._stats["connections_opened"] += 1
+            else:
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._stats["timeouts"] += 1
+                    raise PoolTimeoutError(
+                        f"No database connection available within {self.timeout}s"
+                    )
+        waited = time.monotonic() - started
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["wait_time_total"] += waited
+            self._stats["wait_time_max"] = max(self._stats["wait_time_max"], waited)
+        logger.debug("Connection acquired", extra={"wait": round(waited, 6), "sample": HOT_PATH_SAMPLE})
+        return conn
+
+    def release(self, conn: sqlite3.Connection, discard: bool = False):
+        if not discard:
+            try:
+                # Незакоммиченные изменения не должны переживать возврат в пул
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                discard = True
+        if discard or self._closed:
+            try:
+                conn.close()
+            finally:
+                with self._lock:
+                    self._created -= 1
+                    self._stats["connections_discarded"] += 1
+            return
+        self._idle.put(conn)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = self.size
+            stats["open"] = self._created
+        stats["idle"] = self._idle.qsize()
+        stats["in_use"] = stats["open"] - stats["idle"]
+        checkouts = stats["checkouts"] or 1
+        stats["wait_time_avg"] = stats["wait_time_total"] / checkouts
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    """Получить пул соединений (создается при первом обращении)"""
+    global _pool
+    if _pool is None or _pool.path != DATABASE_PATH:
+        with _pool_lock:
+            if _pool is None or _pool.path != DATABASE_PATH:
+                if _pool is not None:
+                    _pool.close()
+                _pool = ConnectionPool(DATABASE_PATH)
+    return _pool
+
+def close_pool():
+    """Закрыть все соединения пула"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+def get_pool_stats() -> dict:
+    """Статистика пула соединений"""
+    return get_pool().stats()
+
 @contextmanager
 def get_db():
     """Контекстный менеджер для подключения к базе данных"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    # Убираем row_factory, так как он может вызывать проблемы
+    pool = get_pool()
+    conn = pool.acquire()
     try:
         yield conn
     finally:
-        conn.close()
+        pool.release(conn)
+
+class DBExecutor:
+    """Выделенный пул потоков для синхронного кода работы с SQLite.
+
+    Асинхронные обработчики FastAPI не должны выполнять запросы прямо в
+    event loop: один медленный запрос блокирует все остальные.
+    """
+
+    def __init__(self, workers: int = DB_EXECUTOR_WORKERS, thread_name_prefix: str = "db"):
+        self.workers = workers
+        self.thread_name_prefix = thread_name_prefix
+        self._executor = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "cancelled": 0,
+            "queued": 0,
+            "running": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "run_time_total": 0.0,
+        }
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                        thread_name_prefix=self.thread_name_prefix)
+        return self._executor
+
+    def _call(self, submitted_at: float, func, args, kwargs):
+        started = time.monotonic()
+        waited = started - submitted_at
+        with self._lock:
+            self._stats["queued"] -= 1
+            self._stats["running"] += 1
+            self._stats["wait_time_total"] += waited
+            self._stats["wait_time_max"] = max(self._stats["wait_time_max"], waited)
+        failed = False
+        try:
+            return func(*args, **kwargs)
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            with self._lock:
+                self._stats["running"] -= 1
+                self._stats["failed" if failed else "completed"] += 1
+                self._stats["run_time_total"] += time.monotonic() - started
+
+    async def run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._stats["submitted"] += 1
+            self._stats["queued"] += 1
+        call = functools.partial(self._call, time.monotonic(), func, args, kwargs)
+        future = self._get_executor().submit(call)
+        # Задача, отмененная до запуска (клиент отключился), в _call не попадет
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future, loop=loop)
+
+    def _on_done(self, future):
+        if future.cancelled():
+            with self._lock:
+                self._stats["queued"] -= 1
+                self._stats["cancelled"] += 1
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["workers"] = self.workers
+        finished = (stats["completed"] + stats["failed"]) or 1
+        stats["wait_time_avg"] = stats["wait_time_total"] / finished
+        stats["run_time_avg"] = stats["run_time_total"] / finished
+        return stats
+
+
+db_executor = DBExecutor()
+
+async def run_db(func, *args, **kwargs):
+    """Выполнить синхронную функцию работы с БД вне event loop"""
+    return await db_executor.run(func, *args, **kwargs)
+
+def get_executor_stats() -> dict:
+    """Статистика очереди запросов к БД"""
+    return db_executor.stats()
+
+def _add_column_if_missing(cursor, table: str, column: str, definition: str) -> bool:
+    """Добавить колонку в существующую таблицу; True, если колонка была добавлена"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if any(row[1] == column for row in cursor.fetchall()):
+        return False
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return True
+
+# Таблицы с версией в table_versions и события, которые ее увеличивают.
+# У пользователей в выдачу задач попадают только телефон и город
+VERSIONED_TABLES = {
+    "tasks": ("INSERT", "UPDATE", "DELETE"),
+    "project_responses": ("INSERT", "UPDATE", "DELETE"),
+    "service_offers": ("INSERT", "UPDATE", "DELETE"),
+    "users": ("UPDATE OF phone, city",),
+}
 
 def create_tables():
     """Создание всех таблиц в базе данных"""
@@ -48,10 +332,13 @@ def create_tables():
                 category TEXT NOT NULL,
                 address TEXT NOT NULL,
                 date TEXT NOT NULL,
+                date_sort TEXT,
                 price REAL NOT NULL,
                 photos TEXT,
                 status TEXT DEFAULT 'open',
                 customer_id INTEGER NOT NULL,
+                responses_count INTEGER NOT NULL DEFAULT 0,
+                version INTEGER NOT NULL DEFAULT 0,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (customer_id) REFERENCES users (id)
@@ -101,13 +388,250 @@ def create_tables():
             )
         ''')
         
+        # Ссылки на фотографии задач (сами файлы лежат в хранилище фото)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS task_photos (
+                task_id INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                photo_ref TEXT NOT NULL,
+                PRIMARY KEY (task_id, position),
+                FOREIGN KEY (task_id) REFERENCES tasks (id) ON DELETE CASCADE
+            )
+        ''')
+        
+        # Сессии входа: в БД хранится только хеш текущего refresh-токена,
+        # при каждом обновлении токен меняется (ротация)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                refresh_hash TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                expires_at TIMESTAMP NOT NULL,
+                revoked_at TIMESTAMP,
+                previous_hash TEXT,
+                rotated_at TIMESTAMP,
+                parent_id TEXT,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+        
+        # Отозванные сессии: access-токены с этим sid больше не принимаются.
+        # Зеркалируется в память каждого воркера (app/auth/revocation.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS revoked_sessions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                revoked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                expires_at TIMESTAMP NOT NULL
+            )
+        ''')
+        
+        # Фоновые задания (app/jobs.py). Время - unix-время в секундах (REAL):
+        # для задержек повтора и статистики нужна точность меньше секунды.
+        # Пока задание выполняется, run_at - срок аренды: если воркер умер,
+        # задание снова станет доступным
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                idempotency_key TEXT UNIQUE,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL DEFAULT 5,
+                run_at REAL NOT NULL,
+                locked_by TEXT,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                finished_at REAL
+            )
+        ''')
+        
         # Создаем индексы для производительности
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_phone ON users(phone)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_customer ON tasks(customer_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_category ON tasks(category)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_responses_task ON project_responses(task_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_notifications_user ON notifications(user_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions(user_id)')
+        
+        # Миграция: предыдущий refresh-токен сессии принимается короткое время
+        # после ротации (параллельные обновления из нескольких вкладок)
+        _add_column_if_missing(cursor, 'sessions', 'previous_hash', 'TEXT')
+        _add_column_if_missing(cursor, 'sessions', 'rotated_at', 'TIMESTAMP')
+        # Миграция: сессия, открытая предыдущим токеном в окне ротации,
+        # отзывается вместе с родительской
+        _add_column_if_missing(cursor, 'sessions', 'parent_id', 'TEXT')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_parent ON sessions(parent_id)')
+        # Прежняя схема хранила следующий токен в successor: больше не нужен
+        if 'successor' in {column[1] for column in cursor.execute('PRAGMA table_info(sessions)')}:
+            cursor.execute('UPDATE sessions SET successor = NULL WHERE successor IS NOT NULL')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_revoked_sessions_expires ON revoked_sessions(expires_at)')
+        # Миграция: одна строка на пару (исполнитель, категория). Дубликаты,
+        # оставшиеся от прежнего пересоздания предложений, удаляются до
+        # создания уникального индекса
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_service_offers_performer_category'")
+        if cursor.fetchone() is None:
+            cursor.execute('''
+                DELETE FROM service_offers WHERE id NOT IN (
+                    SELECT MAX(id) FROM service_offers GROUP BY performer_id, category
+                )
+            ''')
+            cursor.execute('CREATE UNIQUE INDEX idx_service_offers_performer_category ON service_offers(performer_id, category)')
+        # Миграция: один отклик исполнителя на задачу. Дубликаты, которые могли
+        # появиться при параллельной отправке, удаляются (остается первый).
+        # Уникальный индекс заменяет индекс по task_id - тот его префикс
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_responses_task_performer'")
+        if cursor.fetchone() is None:
+            cursor.execute('''
+                DELETE FROM project_responses WHERE id NOT IN (
+                    SELECT MIN(id) FROM project_responses GROUP BY task_id, performer_id
+                )
+            ''')
+            cursor.execute('CREATE UNIQUE INDEX idx_responses_task_performer ON project_responses(task_id, performer_id)')
+            cursor.execute('DROP INDEX IF EXISTS idx_responses_task')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_responses_performer ON project_responses(performer_id)')
+        
+        # Выборка следующего задания читает только незавершенные
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs(run_at) WHERE status IN ('pending', 'running')")
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs(finished_at) WHERE finished_at IS NOT NULL')
+        
+        # Составные индексы для keyset-пагинации по (created_at, id)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_created ON tasks(created_at, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_status_created ON tasks(status, created_at, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_status_category_created ON tasks(status, category, created_at, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_customer_created ON tasks(customer_id, created_at, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_notifications_user_created ON notifications(user_id, created_at, id)')
+        # Частичный индекс только по непрочитанным; is_read в ключе делает его покрывающим,
+        # так что счетчик на дашборде не читает таблицу
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_notifications_user_unread ON notifications(user_id, is_read) WHERE is_read = 0')
+        
+        # Миграция: дата задачи в сортируемом виде (заполняется backfill_task_dates)
+        _add_column_if_missing(cursor, 'tasks', 'date_sort', 'TEXT')
+        
+        # Индексы для фильтров и сортировок по цене и дате; (status, category, price)
+        # покрывает подсчет фасетов без чтения таблицы
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_status_price ON tasks(status, price, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_status_date ON tasks(status, date_sort, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_status_category_price ON tasks(status, category, price)')
+        
+        # Полнотекстовый индекс задач (external content: текст хранится только в tasks).
+        # unicode61 приводит кириллицу к нижнему регистру, префиксные индексы
+        # ускоряют поиск по началу слова. Букву ё unicode61 не сворачивает,
+        # поэтому в индекс текст попадает уже с ё -> е
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tasks_fts'")
+        fts_exists = cursor.fetchone() is not None
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+                title, description, address,
+                content='tasks', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2',
+                prefix='2 3 4'
+            )
+        ''')
+        
+        def fts_text(row: str) -> str:
+            return ", ".join(
+                f"replace(replace({row}.{column}, 'ё', 'е'), 'Ё', 'Е')"
+                for column in ("title", "description", "address")
+            )
+        
+        if not fts_exists:
+            cursor.execute(f"INSERT INTO tasks_fts(rowid, title, description, address) SELECT id, {fts_text('tasks')} FROM tasks")
+        
+        # Триггеры синхронизируют полнотекстовый индекс с таблицей задач
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_tasks_fts_insert AFTER INSERT ON tasks
+            BEGIN
+                INSERT INTO tasks_fts(rowid, title, description, address)
+                VALUES (NEW.id, {fts_text('NEW')});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_tasks_fts_delete AFTER DELETE ON tasks
+            BEGIN
+                INSERT INTO tasks_fts(tasks_fts, rowid, title, description, address)
+                VALUES ('delete', OLD.id, {fts_text('OLD')});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_tasks_fts_update AFTER UPDATE OF title, description, address ON tasks
+            BEGIN
+                INSERT INTO tasks_fts(tasks_fts, rowid, title, description, address)
+                VALUES ('delete', OLD.id, {fts_text('OLD')});
+                INSERT INTO tasks_fts(rowid, title, description, address)
+                VALUES (NEW.id, {fts_text('NEW')});
+            END
+        ''')
+        
+        # Миграция: счетчик откликов хранится в самой задаче
+        if _add_column_if_missing(cursor, 'tasks', 'responses_count', 'INTEGER NOT NULL DEFAULT 0'):
+            cursor.execute('''
+                UPDATE tasks SET responses_count = (
+                    SELECT COUNT(*) FROM project_responses pr WHERE pr.task_id = tasks.id
+                )
+            ''')
+        
+        # Миграция: версия задачи для оптимистичных проверок при смене статуса
+        _add_column_if_missing(cursor, 'tasks', 'version', 'INTEGER NOT NULL DEFAULT 0')
+        
+        # Триггеры поддерживают счетчик откликов при любых изменениях и
+        # обновляют updated_at задачи: по нему отдается Last-Modified.
+        # Старые версии триггеров (без updated_at) пересоздаются
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_responses_count_insert'")
+        trigger = cursor.fetchone()
+        if trigger and 'updated_at' not in trigger[0]:
+            for suffix in ('insert', 'delete', 'move'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS trg_responses_count_{suffix}")
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_responses_count_insert
+            AFTER INSERT ON project_responses
+            BEGIN
+                UPDATE tasks SET responses_count = responses_count + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE id = NEW.task_id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_responses_count_delete
+            AFTER DELETE ON project_responses
+            BEGIN
+                UPDATE tasks SET responses_count = responses_count - 1, updated_at = CURRENT_TIMESTAMP
+                WHERE id = OLD.task_id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_responses_count_move
+            AFTER UPDATE OF task_id ON project_responses
+            WHEN NEW.task_id <> OLD.task_id
+            BEGIN
+                UPDATE tasks SET responses_count = responses_count - 1, updated_at = CURRENT_TIMESTAMP
+                WHERE id = OLD.task_id;
+                UPDATE tasks SET responses_count = responses_count + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE id = NEW.task_id;
+            END
+        ''')
+        
+        # Версии таблиц для кеша ответов (app/cache.py): триггеры увеличивают
+        # версию при любой записи, так что изменения видят все воркеры
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS table_versions (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        for table, events in VERSIONED_TABLES.items():
+            cursor.execute("INSERT OR IGNORE INTO table_versions (name) VALUES (?)", (table,))
+            for event in events:
+                suffix = event.split()[0].lower()
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{suffix}
+                    AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE table_versions SET version = version + 1 WHERE name = '{table}';
+                    END
+                ''')
         
         conn.commit()
-        print("✅ Таблицы базы данных созданы успешно!")
+        logger.info("Таблицы базы данных созданы")
@@ -0,0 +1,263 @@
+import os
+import json
+import time
+import random
+import socket
+import asyncio
+import logging
+from typing import Callable, Optional
+from app.database import get_db, run_db
+from app.logging_config import HOT_PATH_SAMPLE
+
+logger = logging.getLogger(__name__)
+
+JOBS_WORKERS = int(os.getenv("ULE_JOBS_WORKERS", "2"))
+# Как часто проверять таблицу, если воркер не разбудили (задания других
+# процессов, отложенные повторы)
+JOBS_POLL_INTERVAL = float(os.getenv("ULE_JOBS_POLL_INTERVAL", "1"))
+# Аренда задания: если воркер не отчитался за это время, задание снова
+# доступно. Должна быть больше времени выполнения любого обработчика
+JOBS_LEASE_SECONDS = float(os.getenv("ULE_JOBS_LEASE_SECONDS", "60"))
+JOBS_MAX_ATTEMPTS = int(os.getenv("ULE_JOBS_MAX_ATTEMPTS", "5"))
+JOBS_BACKOFF_BASE = float(os.getenv("ULE_JOBS_BACKOFF_BASE", "2"))
+JOBS_BACKOFF_MAX = float(os.getenv("ULE_JOBS_BACKOFF_MAX", "600"))
+# Сколько хранить выполненные задания (и их ключи идемпотентности)
+JOBS_RETENTION_DAYS = float(os.getenv("ULE_JOBS_RETENTION_DAYS", "7"))
+JOBS_PURGE_INTERVAL = 3600
+JOBS_STOP_TIMEOUT = 5.0
+
+# kind -> (обработчик, вызов после commit)
+_handlers = {}
+
+def register_job(kind: str, handler: Callable, after_commit: Callable = None):
+    """Зарегистрировать обработчик заданий вида kind.
+
+    handler(cursor, payload) выполняется в потоке БД в одной транзакции с
+    отметкой о выполнении: если транзакция не прошла, задание повторится,
+    а записанное обработчиком откатится. after_commit() вызывается после
+    успешного commit (например, чтобы разбудить SSE-подписчиков).
+    """
+    _handlers[kind] = (handler, after_commit)
+
+def enqueue_job(cursor, kind: str, payload: dict, key: str = None,
+                delay: float = 0, max_attempts: int = JOBS_MAX_ATTEMPTS) -> bool:
+    """Добавить задание в транзакции вызывающего кода.
+
+    Задание появится вместе с основной записью запроса или не появится
+    совсем. Повторное добавление с тем же key игнорируется. После commit
+    вызовите job_queue.wake(), чтобы не ждать следующего опроса.
+    """
+    now = time.time()
+    cursor.execute("""
+        INSERT INTO jobs (kind, payload, idempotency_key, max_attempts, run_at, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (idempotency_key) DO NOTHING
+    """, (kind, json.dumps(payload, ensure_ascii=False), key, max_attempts, now + delay, now))
+    return cursor.rowcount > 0
+
+def _claim(worker_id: str) -> Optional[tuple]:
+    """Взять следующее готовое задание в аренду.
+
+    UPDATE ... RETURNING выполняется атомарно, поэтому одно задание не
+    достанется двум воркерам, в том числе из разных процессов.
+    """
+    now = time.time()
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE jobs SET status = 'running', attempts = attempts + 1,
+                            locked_by = ?, run_at = ?
+            WHERE id = (
+                SELECT id FROM jobs
+                WHERE status IN ('pending', 'running') AND run_at <= ?
+                ORDER BY run_at LIMIT 1
+            )
+            RETURNING id, kind, payload, attempts, max_attempts, created_at
+        """, (worker_id, now + JOBS_LEASE_SECONDS, now))
+        row = cursor.fetchone()
+        conn.commit()
+    if row is not None:
+        logger.debug("Job claimed", extra={"job_id": row[0], "kind": row[1], "attempt": row[3],
+                                           "worker": worker_id, "sample": HOT_PATH_SAMPLE})
+    return row
+
+def _execute(job_id: int, kind: str, payload: dict, worker_id: str) -> bool:
+    """Выполнить обработчик и отметить задание выполненным одной транзакцией"""
+    handler, after_commit = _handlers[kind]
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE jobs SET status = 'done', finished_at = ?, locked_by = NULL, last_error = NULL
+            WHERE id = ? AND locked_by = ? AND status = 'running'
+        """, (time.time(), job_id, worker_id))
+        if cursor.rowcount == 0:
+            # Аренда истекла и задание забрал другой воркер
+            conn.rollback()
+            return False
+        handler(cursor, payload)
+        conn.commit()
+    if after_commit:
+        after_commit()
+    return True
+
+def _backoff(attempts: int) -> float:
+    delay = min(JOBS_BACKOFF_MAX, JOBS_BACKOFF_BASE * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+def _fail(job_id: int, attempts: int, max_attempts: int, error: str, worker_id: str) -> bool:
+    """Отложить повтор; после max_attempts попыток задание помечается failed"""
+    now = time.time()
+    with get_db() as conn:
+        cursor = conn.cursor()
+        if attempts >= max_attempts:
+            cursor.execute("""
+                UPDATE jobs SET status = 'failed', finished_at = ?, locked_by = NULL, last_error = ?
+                WHERE id = ? AND locked_by = ?
+            """, (now, error, job_id, worker_id))
+            conn.commit()
+            return False
+        cursor.execute("""
+            UPDATE jobs SET status = 'pending', run_at = ?, locked_by = NULL, last_error = ?
+            WHERE id = ? AND locked_by = ?
+        """, (now + _backoff(attempts), error, job_id, worker_id))
+        conn.commit()
+        return True
+
+def purge_jobs() -> int:
+    """Удалить завершенные задания старше срока хранения"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM jobs WHERE finished_at < ?",
+                       (time.time() - JOBS_RETENTION_DAYS * 86400,))
+        conn.commit()
+        return cursor.rowcount
+
+def _queue_depth() -> dict:
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT status, COUNT(*), MIN(run_at) FROM jobs
+            WHERE status IN ('pending', 'running') GROUP BY status
+        """)
+        rows = cursor.fetchall()
+    depth = {status: count for status, count, _ in rows}
+    oldest = min((run_at for status, _, run_at in rows if status == "pending"), default=None)
+    return {
+        "pending": depth.get("pending", 0),
+        "running": depth.get("running", 0),
+        "oldest_pending_age": round(max(0.0, time.time() - oldest), 3) if oldest else 0.0,
+    }
+
+class JobQueue:
+    """Пул asyncio-воркеров, выполняющих задания из таблицы jobs"""
+
+    def __init__(self, workers: int = JOBS_WORKERS):
+        self.workers = workers
+        self._loop = None
+        self._wakeup = None
+        self._stopped = None
+        self._tasks = []
+        self._stopping = False
+        self._prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self._stats = {
+            "claimed": 0, "done": 0, "retried": 0, "failed": 0, "lost_lease": 0,
+            "wait_time_total": 0.0, "wait_time_max": 0.0, "run_time_total": 0.0,
+        }
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._stopped = asyncio.Event()
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._worker(f"{self._prefix}:{index}"))
+                       for index in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._purge_loop()))
+
+    async def stop(self):
+        """Дать текущим заданиям завершиться; прерванные повторятся по истечении аренды"""
+        self._stopping = True
+        if self._wakeup:
+            self._wakeup.set()
+            self._stopped.set()
+        if self._tasks:
+            _, pending = await asyncio.wait(self._tasks, timeout=JOBS_STOP_TIMEOUT)
+            for task in pending:
+                task.cancel()
+        self._tasks = []
+
+    def wake(self):
+        """Сообщить о новом задании; можно вызывать из потока БД"""
+        loop, wakeup = self._loop, self._wakeup
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(wakeup.set)
+        except RuntimeError:
+            # Цикл событий уже остановлен
+            pass
+
+    async def _worker(self, worker_id: str):
+        while not self._stopping:
+            # Сброс до выборки: задание, добавленное после нее, снова разбудит воркер
+            self._wakeup.clear()
+            try:
+                job = await run_db(_claim, worker_id)
+            except Exception:
+                logger.exception("Job claim failed")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), JOBS_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job, worker_id)
+
+    async def _run(self, job: tuple, worker_id: str):
+        job_id, kind, payload, attempts, max_attempts, created_at = job
+        started = time.time()
+        wait_time = max(0.0, started - created_at)
+        self._stats["claimed"] += 1
+        self._stats["wait_time_total"] += wait_time
+        self._stats["wait_time_max"] = max(self._stats["wait_time_max"], wait_time)
+        try:
+            if kind not in _handlers:
+                raise LookupError(f"Unknown job kind: {kind}")
+            if await run_db(_execute, job_id, kind, json.loads(payload), worker_id):
+                self._stats["done"] += 1
+            else:
+                self._stats["lost_lease"] += 1
+        except Exception as e:
+            retried = await run_db(_fail, job_id, attempts, max_attempts, repr(e), worker_id)
+            self._stats["retried" if retried else "failed"] += 1
+            logger.warning("Job failed", exc_info=True,
+                           extra={"job_id": job_id, "kind": kind, "attempt": attempts, "retry": retried})
+        finally:
+            self._stats["run_time_total"] += time.time() - started
+
+    async def _purge_loop(self):
+        while not self._stopping:
+            try:
+                removed = await run_db(purge_jobs)
+                if removed:
+                    logger.info("Finished jobs purged", extra={"removed": removed})
+            except Exception:
+                logger.exception("Job purge failed")
+            try:
+                await asyncio.wait_for(self._stopped.wait(), JOBS_PURGE_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        claimed = stats["claimed"]
+        stats["wait_time_avg"] = stats["wait_time_total"] / claimed if claimed else 0.0
+        stats["run_time_avg"] = stats["run_time_total"] / claimed if claimed else 0.0
+        stats["workers"] = self.workers
+        return stats
+
+job_queue = JobQueue()
+
+def get_job_stats() -> dict:
+    """Статистика заданий; читает БД, вызывать через run_db"""
+    return {**_queue_depth(), **job_queue.stats()}
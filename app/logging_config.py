@@ -0,0 +1,129 @@
+import os
+import sys
+import copy
+import json
+import queue
+import random
+import atexit
+import logging
+import logging.handlers
+from datetime import datetime, timezone
+
+# Общий уровень и уровни отдельных модулей:
+# ULE_LOG_LEVEL=INFO ULE_LOG_LEVELS="app.tasks=DEBUG,app.auth.service=WARNING"
+LOG_LEVEL = os.getenv("ULE_LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("ULE_LOG_LEVELS", "")
+# json - по строке JSON на запись, text - для чтения глазами при разработке
+LOG_FORMAT = os.getenv("ULE_LOG_FORMAT", "json")
+LOG_QUEUE_SIZE = int(os.getenv("ULE_LOG_QUEUE_SIZE", "10000"))
+# Доля отладочных записей горячих путей (пул, кеши, очередь заданий),
+# которые попадают в лог: extra={"sample": HOT_PATH_SAMPLE}
+HOT_PATH_SAMPLE = float(os.getenv("ULE_LOG_SAMPLE_RATE", "0.01"))
+
+# Атрибуты LogRecord, которые не считаются пользовательскими полями из extra
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "sample"}
+
+_listener = None
+
+class JSONFormatter(logging.Formatter):
+    """Запись лога одной строкой JSON; поля из extra попадают в объект как есть"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class SamplingFilter(logging.Filter):
+    """Пропускает долю записей, помеченных extra={"sample": 0.01}.
+
+    Для частых сообщений в горячих путях: остальные записи проходят всегда.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = getattr(record, "sample", None)
+        if rate is None or rate >= 1:
+            return True
+        return random.random() < rate
+
+class _DropOnFullQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который не блокирует запрос при переполненной очереди"""
+
+    dropped = 0
+
+    def prepare(self, record):
+        # В отличие от базового prepare не форматирует запись целиком:
+        # подставляет аргументы и сохраняет traceback отдельным полем
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DropOnFullQueueHandler.dropped += 1
+
+def _parse_levels(spec: str) -> dict:
+    levels = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        name, level = item.split("=", 1)
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+def setup_logging():
+    """Настроить логирование приложения (повторный вызов ничего не делает).
+
+    Запросы только кладут запись в очередь; форматирование и запись в
+    stdout выполняет фоновый поток QueueListener.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "text":
+        stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    else:
+        stream.setFormatter(JSONFormatter())
+
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler = _DropOnFullQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+    for name, level in _parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+def shutdown_logging():
+    """Дописать записи из очереди и остановить фоновый поток"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def get_logging_stats() -> dict:
+    return {"level": LOG_LEVEL, "dropped": _DropOnFullQueueHandler.dropped}
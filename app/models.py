@@ -30,6 +30,13 @@ class TaskStatus(str, Enum):
     COMPLETED = "completed"
     CANCELLED = "cancelled"
 
+class TaskSort(str, Enum):
+    NEWEST = "newest"
+    OLDEST = "oldest"
+    PRICE_ASC = "price_asc"
+    PRICE_DESC = "price_desc"
+    DATE_ASC = "date_asc"
+
 class ResponseStatus(str, Enum):
     PENDING = "pending"
     ACCEPTED = "accepted"
@@ -64,6 +71,11 @@ class TaskResponse(BaseModel):
     created_at: datetime
     responses_count: int
 
+class TaskPage(BaseModel):
+    items: List[TaskResponse]
+    next_cursor: Optional[str] = None
+    total_estimate: Optional[int] = None
+
 class TaskUpdate(BaseModel):
     service_category: Optional[ServiceCategory] = None
     description: Optional[str] = None
@@ -71,6 +83,7 @@ class TaskUpdate(BaseModel):
     date: Optional[str] = None
     price: Optional[float] = None
     photos: Optional[List[str]] = None
+    status: Optional[TaskStatus] = None
 
 class ServiceOffer(BaseModel):
     id: Optional[int] = None
@@ -104,3 +117,10 @@ class Notification(BaseModel):
     message: str
     is_read: bool = False
     created_at: datetime
+
+class NotificationsReadRequest(BaseModel):
+    ids: Optional[List[int]] = Field(None, max_length=500)  # None - отметить все
+
+class NotificationPage(BaseModel):
+    items: List[Notification]
+    next_cursor: Optional[str] = None
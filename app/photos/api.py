@@ -0,0 +1,57 @@
+from typing import List
+from fastapi import APIRouter, HTTPException, Depends, File, UploadFile
+from fastapi.responses import FileResponse, Response
+from starlette.concurrency import run_in_threadpool
+from app.auth.dependencies import get_current_user
+from app.photos.service import (
+    PHOTO_NAME_RE, PHOTOS_ACCEL_PREFIX, MEDIA_TYPES,
+    store_photo_file, photo_path, photo_url
+)
+import os
+
+router = APIRouter()
+
+# Имя файла - хеш содержимого, поэтому его можно кешировать навсегда
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+@router.post("", response_model=dict)
+async def upload_photos(
+    files: List[UploadFile] = File(...),
+    user: dict = Depends(get_current_user)
+):
+    """Загрузить фотографии (multipart), вернуть их URL"""
+    try:
+        photos = []
+        for upload in files:
+            # Копирование на диск идет в пуле потоков, не блокируя event loop
+            name = await run_in_threadpool(store_photo_file, upload.file)
+            photos.append({"id": name, "url": photo_url(name)})
+        
+        return {"success": True, "photos": photos}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        for upload in files:
+            await upload.close()
+
+@router.get("/{name}")
+async def get_photo(name: str):
+    """Отдать фотографию с долгоживущими заголовками кеширования"""
+    if not PHOTO_NAME_RE.match(name):
+        raise HTTPException(status_code=404, detail="Photo not found")
+    
+    path = photo_path(name)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Photo not found")
+    
+    media_type = MEDIA_TYPES[name.rsplit(".", 1)[1]]
+    headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL, "ETag": f'"{name.split(".")[0]}"'}
+    
+    if PHOTOS_ACCEL_PREFIX:
+        # Файл отдает nginx из internal location
+        headers["X-Accel-Redirect"] = PHOTOS_ACCEL_PREFIX.rstrip("/") + "/" + name[:2] + "/" + name
+        return Response(headers=headers, media_type=media_type)
+    
+    return FileResponse(path, media_type=media_type, headers=headers)
@@ -0,0 +1,190 @@
+import os
+import re
+import logging
+import json
+import base64
+import hashlib
+import tempfile
+from typing import BinaryIO, Dict, Iterable, List, Optional
+from app.database import get_db
+
+logger = logging.getLogger(__name__)
+
+# Каталог хранилища фотографий (файлы называются по SHA-256 содержимого)
+PHOTOS_DIR = os.environ.get("ULE_PHOTOS_DIR", "media/photos")
+PHOTOS_URL_PREFIX = "/api/v1/photos/"
+# Если задан, файлы отдает nginx через X-Accel-Redirect (internal location)
+PHOTOS_ACCEL_PREFIX = os.environ.get("ULE_PHOTOS_ACCEL_PREFIX")
+
+MAX_PHOTO_SIZE = 10 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+PHOTO_NAME_RE = re.compile(r"^[0-9a-f]{64}\.(jpg|png|webp|gif)$")
+
+# Сигнатуры поддерживаемых форматов: расширение определяется по содержимому,
+# а не по заголовку Content-Type от клиента
+_SIGNATURES = [
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+]
+
+MEDIA_TYPES = {
+    "jpg": "image/jpeg",
+    "png": "image/png",
+    "webp": "image/webp",
+    "gif": "image/gif",
+}
+
+def _detect_extension(head: bytes) -> Optional[str]:
+    for signature, extension in _SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+def photo_path(name: str) -> str:
+    """Путь к файлу фотографии в хранилище"""
+    return os.path.join(PHOTOS_DIR, name[:2], name)
+
+def photo_url(ref: str) -> str:
+    """URL фотографии по ссылке из task_photos"""
+    if ref.startswith(("http://", "https://", "/")):
+        return ref
+    return PHOTOS_URL_PREFIX + ref
+
+def store_photo(chunks: Iterable[bytes]) -> str:
+    """Потоково сохранить фотографию в хранилище, вернуть ее имя.
+
+    Файл пишется во временный файл с подсчетом SHA-256 и затем атомарно
+    переименовывается в <sha256>.<ext>; одинаковые фото хранятся один раз.
+    """
+    tmp_dir = os.path.join(PHOTOS_DIR, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    extension = None
+    
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                if extension is None:
+                    extension = _detect_extension(chunk[:16])
+                    if extension is None:
+                        raise ValueError("Unsupported image format")
+                size += len(chunk)
+                if size > MAX_PHOTO_SIZE:
+                    raise ValueError("Photo is too large")
+                digest.update(chunk)
+                tmp.write(chunk)
+        if extension is None:
+            raise ValueError("Empty photo")
+        
+        name = f"{digest.hexdigest()}.{extension}"
+        path = photo_path(name)
+        if os.path.exists(path):
+            # Такое фото уже есть - дубликат не сохраняем
+            os.unlink(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        return name
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def store_photo_file(fileobj: BinaryIO) -> str:
+    """Сохранить фотографию из файлового объекта (например, UploadFile.file)"""
+    return store_photo(iter(lambda: fileobj.read(CHUNK_SIZE), b""))
+
+def store_data_url(data_url: str) -> str:
+    """Сохранить фотографию, переданную старым клиентом как base64 data URL"""
+    try:
+        header, encoded = data_url.split(",", 1)
+        data = base64.b64decode(encoded)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid photo data")
+    if not header.startswith("data:image/"):
+        raise ValueError("Invalid photo data")
+    return store_photo(data[i:i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE))
+
+def normalize_photo_ref(photo: str) -> str:
+    """Привести фото из запроса к ссылке для task_photos.
+
+    Принимаются только загруженные в хранилище фото (/api/v1/photos/<хеш>)
+    и data URL старых клиентов; сторонние адреса в данные задачи не попадают.
+    """
+    if photo.startswith("data:"):
+        return store_data_url(photo)
+    if photo.startswith(PHOTOS_URL_PREFIX):
+        name = photo[len(PHOTOS_URL_PREFIX):]
+        if PHOTO_NAME_RE.match(name):
+            if not os.path.exists(photo_path(name)):
+                raise ValueError("Photo not found")
+            return name
+    raise ValueError("Invalid photo reference")
+
+def replace_task_photos(cursor, task_id: int, refs: List[str]):
+    """Заменить фотографии задачи (вызывается внутри транзакции задачи)"""
+    cursor.execute("DELETE FROM task_photos WHERE task_id = ?", (task_id,))
+    cursor.executemany(
+        "INSERT INTO task_photos (task_id, position, photo_ref) VALUES (?, ?, ?)",
+        [(task_id, position, ref) for position, ref in enumerate(refs)]
+    )
+
+def load_task_photos(cursor, task_ids: List[int]) -> Dict[int, List[str]]:
+    """URL фотографий для набора задач одним запросом"""
+    result = {task_id: [] for task_id in task_ids}
+    if not task_ids:
+        return result
+    placeholders = ",".join("?" * len(task_ids))
+    cursor.execute(f"""
+        SELECT task_id, photo_ref FROM task_photos
+        WHERE task_id IN ({placeholders})
+        ORDER BY task_id, position
+    """, task_ids)
+    for task_id, ref in cursor.fetchall():
+        result[task_id].append(photo_url(ref))
+    return result
+
+def migrate_legacy_photos(batch_size: int = 50) -> int:
+    """Перенести base64-фото из tasks.photos в хранилище и task_photos"""
+    migrated = 0
+    while True:
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, photos FROM tasks WHERE photos IS NOT NULL LIMIT ?", (batch_size,))
+            rows = cursor.fetchall()
+            if not rows:
+                return migrated
+            
+            for task_id, photos_str in rows:
+                try:
+                    photos = json.loads(photos_str)
+                except (json.JSONDecodeError, TypeError):
+                    photos = []
+                refs = []
+                for photo in photos if isinstance(photos, list) else []:
+                    if not isinstance(photo, str):
+                        logger.warning("Skipping invalid legacy photo for task %s", task_id)
+                        continue
+                    if photo.startswith(("http://", "https://")):
+                        # Уже сохраненные внешние адреса переносятся как есть
+                        # (photo_url их отдает); новые задачи их не принимают
+                        refs.append(photo)
+                        continue
+                    try:
+                        refs.append(normalize_photo_ref(photo))
+                    except (ValueError, TypeError):
+                        logger.warning("Skipping invalid legacy photo for task %s", task_id)
+                replace_task_photos(cursor, task_id, refs)
+                cursor.execute("UPDATE tasks SET photos = NULL WHERE id = ?", (task_id,))
+                migrated += 1
+            
+            conn.commit()
@@ -1,203 +1,255 @@
-from fastapi import APIRouter, HTTPException, Depends, Header
-from typing import List
-from app.database import get_db
-from app.auth.service import get_user_by_phone, get_current_user_from_token
+import logging
+import sqlite3
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, Header
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from datetime import date
+from app.database import run_db
+from app.cache import is_not_modified, not_modified_response, set_validators
+from app.coalesce import single_flight
+from app.auth.dependencies import get_current_user, get_optional_user
 from app.models import (
     TaskCreate, TaskResponse, TaskUpdate, TaskStatus,
     ServiceOffer, ServiceOfferCreate, ProjectResponse, ProjectResponseCreate, ResponseStatus,
-    ServiceCategory, ProfileUpdate, Notification
+    ServiceCategory, ProfileUpdate, Notification, NotificationsReadRequest, TaskSort
 )
 from app.tasks.service import (
     create_task, get_tasks, get_task, update_task, delete_task,
-    create_service_offer, get_service_offer, update_service_offer,
+    get_service_offer, update_service_offer,
     create_project_response, get_task_responses, update_response_status,
-    get_notifications, mark_notification_read
+    get_notifications, mark_notification_read, search_tasks, get_task_facets,
+    replace_service_offers, mark_notifications_read, get_unread_notifications_count,
+    get_task_feed, get_open_tasks_cached, get_task_validators, get_table_etag
 )
+from app.tasks.events import event_stream, parse_last_event_id
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Одинаковые одновременные запросы к самым нагруженным спискам выполняются один раз
+tasks_flight = single_flight("tasks/list")
+available_flight = single_flight("tasks/available")
+facets_flight = single_flight("tasks/facets")
+search_flight = single_flight("tasks/search")
+
+def flight_key(**params) -> tuple:
+    return tuple(sorted(params.items()))
+
+def set_page_headers(response: Response, page):
+    """Передать курсор следующей страницы и оценку общего числа в заголовках"""
+    if page.next_cursor:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    if getattr(page, "total_estimate", None) is not None:
+        response.headers["X-Total-Estimate"] = str(page.total_estimate)
 
 # Удалили неиспользуемую функцию get_current_user_id
 
 @router.post("/tasks", response_model=dict)
 async def create_new_task(
     task_data: TaskCreate,
-    authorization: str = Header(None)
+    user: dict = Depends(get_current_user)
 ):
     try:
-        print(f"POST /tasks - Received task_data: {task_data}")
-        print(f"POST /tasks - Authorization header: {authorization}")
-        
-        if not authorization:
-            print("POST /tasks - No authorization header")
-            raise HTTPException(status_code=401, detail="No authorization header")
-        
-        if not authorization.startswith("Bearer "):
-            print("POST /tasks - Invalid authorization format")
-            raise HTTPException(status_code=401, detail="Invalid authorization format")
-        
-        token = authorization.replace("Bearer ", "")
-        print(f"POST /tasks - Extracted token: {token[:20]}...")
-        
-        user = get_current_user_from_token(token)
-        if not user:
-            print("POST /tasks - Invalid token")
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        print(f"POST /tasks - User found: {user}")
         user_id = user['id']
         
-        result = create_task(task_data, user_id)
-        print(f"POST /tasks - Task created: {result}")
+        result = await run_db(create_task, task_data, user_id)
+        logger.info("Task created", extra={"task_id": result.get("task_id"), "user_id": user_id})
         return result
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error in create_new_task: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Failed to create task")
         raise HTTPException(status_code=422, detail=str(e))
 
 @router.get("/tasks", response_model=List[TaskResponse])
 async def get_all_tasks(
+    response: Response,
     category: ServiceCategory = None,
     status: TaskStatus = None,
-    authorization: str = Header(None)
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    city: Optional[str] = None,
+    sort: TaskSort = TaskSort.NEWEST,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    user: Optional[dict] = Depends(get_optional_user)
 ):
     try:
-        user_id = None
-        if authorization and authorization.startswith("Bearer "):
-            token = authorization.replace("Bearer ", "")
-            user = get_current_user_from_token(token)
-            if user:
-                user_id = user['id']
-        
-        tasks = get_tasks(customer_id=user_id, category=category, status=status)
-        return tasks
+        user_id = user['id'] if user else None
+        
+        params = dict(customer_id=user_id, category=category, status=status,
+                      min_price=min_price, max_price=max_price,
+                      date_from=date_from.isoformat() if date_from else None,
+                      date_to=date_to.isoformat() if date_to else None,
+                      city=city, sort=sort.value,
+                      limit=limit, cursor=cursor, include_total=include_total)
+        page = await tasks_flight.run(flight_key(**params), get_tasks, **params)
+        set_page_headers(response, page)
+        return page.items
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/tasks/available", response_model=List[TaskResponse])
 async def get_available_tasks(
+    response: Response,
+    category: ServiceCategory = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    city: Optional[str] = None,
+    sort: TaskSort = TaskSort.NEWEST,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    include_total: bool = False
+):
+    try:
+        params = dict(category=category.value if category else None,
+                      min_price=min_price, max_price=max_price,
+                      date_from=date_from.isoformat() if date_from else None,
+                      date_to=date_to.isoformat() if date_to else None,
+                      city=city, sort=sort.value,
+                      limit=limit, cursor=cursor, include_total=include_total)
+        # Промах кеша при всплеске трафика строит страницу один раз
+        page = await available_flight.run(flight_key(**params), get_open_tasks_cached, **params)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Тело уже сериализовано и берется из кеша как есть
+    cached = Response(content=page.body, media_type="application/json")
+    set_page_headers(cached, page)
+    return cached
+
+@router.get("/tasks/feed", response_model=List[TaskResponse])
+async def get_performer_feed(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    user: dict = Depends(get_current_user)
+):
+    """Открытые задачи в категориях, указанных исполнителем в предложении услуг"""
+    try:
+        page = await run_db(get_task_feed, user['id'], limit, cursor)
+        set_page_headers(response, page)
+        return page.items
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/tasks/facets", response_model=dict)
+async def get_tasks_facets(
     category: ServiceCategory = None
 ):
+    """Счетчики открытых задач по категориям и ценовым диапазонам"""
     try:
-        tasks = get_tasks(category=category, status=TaskStatus.OPEN)
-        return tasks
+        category_value = category.value if category else None
+        return await facets_flight.run(category_value, get_task_facets, category_value)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.get("/search", response_model=List[TaskResponse])
+async def search_tasks_api(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    category: ServiceCategory = None,
+    status: TaskStatus = TaskStatus.OPEN,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None
+):
+    """Полнотекстовый поиск по заголовку, описанию и адресу задачи"""
+    try:
+        params = dict(category=category, status=status,
+                      min_price=min_price, max_price=max_price,
+                      limit=limit, cursor=cursor)
+        page = await search_flight.run(flight_key(q=q, **params), search_tasks, q, **params)
+        set_page_headers(response, page)
+        return page.items
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except sqlite3.Error:
+        # Ошибки разбора запроса FTS или привязки параметров - ошибка клиента;
+        # текст SQLite в ответ не попадает
+        logger.warning("Search query failed", exc_info=True)
+        raise HTTPException(status_code=400, detail="Invalid search query")
+
 @router.get("/tasks/my", response_model=List[TaskResponse])
 async def get_my_tasks(
-    authorization: str = Header(None)
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    user: dict = Depends(get_current_user)
 ):
     """Получить все задачи текущего пользователя"""
     try:
-        if not authorization or not authorization.startswith("Bearer "):
-            raise HTTPException(status_code=401, detail="Invalid authorization header")
+        user_id = user['id']
         
-        token = authorization.replace("Bearer ", "")
-        user = get_current_user_from_token(token)
-        if not user:
-            raise HTTPException(status_code=401, detail="Invalid token")
+        # Список не менялся, пока не изменились версии таблиц
+        etag = await run_db(get_table_etag, ("tasks", "users"), user_id, limit, cursor, include_total)
+        if is_not_modified(request, etag):
+            return not_modified_response(etag, private=True)
         
-        user_id = user['id']
+        # Получаем задачи пользователя одним запросом (счетчик откликов хранится в задаче)
+        page = await run_db(get_tasks, customer_id=user_id, limit=limit, cursor=cursor,
+                            include_total=include_total)
+        set_page_headers(response, page)
+        set_validators(response, etag, private=True)
         
-        # Получаем задачи пользователя из базы данных
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT id, title, customer_id, category, description, address, date, 
-                       price, photos, status, created_at, updated_at
-                FROM tasks 
-                WHERE customer_id = ?
-                ORDER BY created_at DESC
-            """, (user_id,))
-            
-            tasks = cursor.fetchall()
-            
-            result = []
-            for task in tasks:
-                # Получаем количество откликов
-                cursor.execute("SELECT COUNT(*) FROM project_responses WHERE task_id = ?", (task[0],))
-                responses_count = cursor.fetchone()[0]
-                
-                # Десериализуем фотографии
-                import json
-                photos = json.loads(task[8]) if task[8] else []
-                
-                task_dict = {
-                    "id": str(task[0]),
-                    "title": task[1],
-                    "customer_id": task[2],
-                    "category": task[3],
-                    "description": task[4],
-                    "address": task[5],
-                    "date": task[6],
-                    "price": task[7],
-                    "photos": photos,
-                    "status": task[9],
-                    "created_at": task[10],
-                    "updated_at": task[11],
-                    "responses_count": responses_count
-                }
-                result.append(task_dict)
-            
-            print(f"Found {len(result)} tasks for user {user_id}")
-            return result
+        return page.items
             
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"Error getting user tasks: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Failed to list user tasks")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/tasks/{task_id}", response_model=TaskResponse)
 async def get_task_by_id(
+    request: Request,
+    response: Response,
     task_id: str  # Принимаем строку и преобразуем в int
 ):
     try:
-        print(f"GET /tasks/{task_id} - Getting task with ID: {task_id}")
-        
         # Преобразуем строку в int
         try:
             task_id_int = int(task_id)
         except ValueError:
-            print(f"Invalid task ID format: {task_id}")
             raise HTTPException(status_code=400, detail="Invalid task ID format")
         
-        task = get_task(task_id_int)
-        print(f"Task found: {task}")
+        # Сначала дешевая проверка версии: при совпадении задача не загружается
+        validators = await run_db(get_task_validators, task_id_int)
+        if not validators:
+            raise HTTPException(status_code=404, detail="Task not found")
+        etag, last_modified = validators
+        if is_not_modified(request, etag, last_modified):
+            return not_modified_response(etag, last_modified)
+        
+        task = await run_db(get_task, task_id_int)
         
         if not task:
-            print(f"Task not found with ID: {task_id_int}")
             raise HTTPException(status_code=404, detail="Task not found")
         
+        set_validators(response, etag, last_modified)
         return task
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error getting task {task_id}: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Failed to get task %s", task_id)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/tasks/{task_id}", response_model=dict)
 async def update_task_by_id(
     task_id: str,
     task_data: TaskUpdate,
-    authorization: str = Header(None)
+    user: dict = Depends(get_current_user)
 ):
     try:
-        if not authorization or not authorization.startswith("Bearer "):
-            raise HTTPException(status_code=401, detail="Invalid authorization header")
-        
-        token = authorization.replace("Bearer ", "")
-        user = get_current_user_from_token(token)
-        if not user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
         # Преобразуем строку в int
         try:
             task_id_int = int(task_id)
@@ -205,7 +257,7 @@ async def update_task_by_id(
             raise HTTPException(status_code=400, detail="Invalid task ID format")
         
         user_id = user['id']
-        result = update_task(task_id_int, task_data, user_id)
+        result = await run_db(update_task, task_id_int, task_data, user_id)
         return result
     except HTTPException:
         raise
@@ -215,17 +267,9 @@ async def update_task_by_id(
 @router.delete("/tasks/{task_id}", response_model=dict)
 async def delete_task_by_id(
     task_id: str,
-    authorization: str = Header(None)
+    user: dict = Depends(get_current_user)
 ):
     try:
-        if not authorization or not authorization.startswith("Bearer "):
-            raise HTTPException(status_code=401, detail="Invalid authorization header")
-        
-        token = authorization.replace("Bearer ", "")
-        user = get_current_user_from_token(token)
-        if not user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
         # Преобразуем строку в int
         try:
             task_id_int = int(task_id)
@@ -233,7 +277,7 @@ async def delete_task_by_id(
             raise HTTPException(status_code=400, detail="Invalid task ID format")
         
         user_id = user['id']
-        result = delete_task(task_id_int, user_id)
+        result = await run_db(delete_task, task_id_int, user_id)
         return result
     except HTTPException:
         raise
@@ -243,88 +287,40 @@ async def delete_task_by_id(
 @router.post("/service-offer", response_model=dict)
 async def create_or_update_service_offer(
     service_data: ServiceOfferCreate,
-    authorization: str = Header(None)
+    user: dict = Depends(get_current_user)
 ):
     try:
-        print(f"POST /service-offer - Received service_data: {service_data}")
-        print(f"POST /service-offer - Authorization header: {authorization}")
-        
-        if not authorization:
-            print("POST /service-offer - No authorization header")
-            raise HTTPException(status_code=401, detail="No authorization header")
-        
-        if not authorization.startswith("Bearer "):
-            print("POST /service-offer - Invalid authorization format")
-            raise HTTPException(status_code=401, detail="Invalid authorization format")
-        
-        token = authorization.replace("Bearer ", "")
-        print(f"POST /service-offer - Extracted token: {token[:20]}...")
-        
-        user = get_current_user_from_token(token)
-        if not user:
-            print("POST /service-offer - Invalid token")
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        print(f"POST /service-offer - User found: {user}")
         user_id = user['id']
         
-        # Сначала удаляем все существующие предложения для этого пользователя
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM service_offers WHERE performer_id = ?", (user_id,))
-            deleted_count = cursor.rowcount
-            print(f"Deleted {deleted_count} existing offers for user {user_id}")
-            conn.commit()
-        
-        # Создаем предложения для каждой категории
-        results = []
-        for category in service_data.service_categories:
-            result = create_service_offer(user_id, category, service_data.description, service_data.hourly_rate)
-            results.append(result)
+        offers = await run_db(replace_service_offers, user_id,
+                              [category.value for category in service_data.service_categories],
+                              service_data.description, service_data.hourly_rate)
         
-        # Проверяем, сколько предложений создалось
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM service_offers WHERE performer_id = ?", (user_id,))
-            final_count = cursor.fetchone()[0]
-            print(f"Final offers count for user {user_id}: {final_count}")
-        
-        print(f"Total offers created: {len(results)}")
-        return {"success": True, "message": f"Created {len(results)} service offers", "results": results}
+        count = len(offers["service_categories"])
+        logger.debug("Service offers replaced", extra={"user_id": user_id, "count": count})
+        return {"success": True, "message": f"Saved {count} service offers", **offers}
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error in create_or_update_service_offer: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Failed to save service offers")
         raise HTTPException(status_code=422, detail=str(e))
 
 @router.get("/service-offer", response_model=dict)
 async def get_user_service_offers(
-    authorization: str = Header(None)
+    request: Request,
+    response: Response,
+    user: dict = Depends(get_current_user)
 ):
     try:
-        print(f"GET /service-offer - Authorization header: {authorization}")
-        
-        if not authorization or not authorization.startswith("Bearer "):
-            raise HTTPException(status_code=401, detail="Invalid authorization header")
-        
-        token = authorization.replace("Bearer ", "")
-        print(f"GET /service-offer - Extracted token: {token[:20]}...")
-        
-        user = get_current_user_from_token(token)
-        if not user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        print(f"GET /service-offer - User found: {user}")
         user_id = user['id']
-        offers = get_service_offer(user_id)
-        print(f"GET /service-offer - Offers: {offers}")
+        etag = await run_db(get_table_etag, ("service_offers",), user_id)
+        if is_not_modified(request, etag):
+            return not_modified_response(etag, private=True)
+        offers = await run_db(get_service_offer, user_id)
+        set_validators(response, etag, private=True)
         return offers
     except Exception as e:
-        print(f"Error in get_user_service_offers: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Failed to get service offers")
         raise HTTPException(status_code=422, detail=str(e))
 
 @router.put("/service-offer/{offer_id}", response_model=dict)
@@ -332,17 +328,9 @@ async def update_user_service_offer(
     offer_id: int,
     description: str = None,
     hourly_rate: float = None,
-    authorization: str = Header(None)
+    user: dict = Depends(get_current_user)
 ):
     try:
-        if not authorization or not authorization.startswith("Bearer "):
-            raise HTTPException(status_code=401, detail="Invalid authorization header")
-        
-        token = authorization.replace("Bearer ", "")
-        user = get_current_user_from_token(token)
-        if not user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
         user_id = user['id']
         
         kwargs = {}
@@ -351,7 +339,7 @@ async def update_user_service_offer(
         if hourly_rate is not None:
             kwargs['hourly_rate'] = hourly_rate
         
-        result = update_service_offer(offer_id, user_id, **kwargs)
+        result = await run_db(update_service_offer, offer_id, user_id, **kwargs)
         return result
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -360,17 +348,9 @@ async def update_user_service_offer(
 async def respond_to_task(
     task_id: str,
     response_data: ProjectResponseCreate,
-    authorization: str = Header(None)
+    user: dict = Depends(get_current_user)
 ):
     try:
-        if not authorization or not authorization.startswith("Bearer "):
-            raise HTTPException(status_code=401, detail="Invalid authorization header")
-        
-        token = authorization.replace("Bearer ", "")
-        user = get_current_user_from_token(token)
-        if not user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
         # Преобразуем строку в int
         try:
             task_id_int = int(task_id)
@@ -378,7 +358,7 @@ async def respond_to_task(
             raise HTTPException(status_code=400, detail="Invalid task ID format")
         
         user_id = user['id']
-        result = create_project_response(task_id_int, user_id, response_data)
+        result = await run_db(create_project_response, task_id_int, user_id, response_data)
         return result
     except HTTPException:
         raise
@@ -388,102 +368,97 @@ async def respond_to_task(
 @router.get("/tasks/{task_id}/responses", response_model=List[ProjectResponse])
 async def get_task_responses_api(
     task_id: str,  # Принимаем строку и преобразуем в int
-    authorization: str = Header(None)
+    user: dict = Depends(get_current_user)
 ):
     try:
-        print(f"GET /tasks/{task_id}/responses - Getting responses for task: {task_id}")
-        
-        if not authorization or not authorization.startswith("Bearer "):
-            print("Invalid authorization header")
-            raise HTTPException(status_code=401, detail="Invalid authorization header")
-        
-        token = authorization.replace("Bearer ", "")
-        user = get_current_user_from_token(token)
-        if not user:
-            print("Invalid token")
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
         # Преобразуем строку в int
         try:
             task_id_int = int(task_id)
         except ValueError:
-            print(f"Invalid task ID format: {task_id}")
             raise HTTPException(status_code=400, detail="Invalid task ID format")
         
         user_id = user['id']
-        print(f"Getting responses for task {task_id_int} by user {user_id}")
         
-        responses = get_task_responses(task_id_int, user_id)
-        print(f"Found {len(responses)} responses")
+        responses = await run_db(get_task_responses, task_id_int, user_id)
         
         return responses
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error getting task responses: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Failed to get responses for task %s", task_id)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/responses/{response_id}/status", response_model=dict)
 async def update_response_status_api(
     response_id: int,
     status: ResponseStatus,
-    authorization: str = Header(None)
+    user: dict = Depends(get_current_user)
 ):
     try:
-        if not authorization or not authorization.startswith("Bearer "):
-            raise HTTPException(status_code=401, detail="Invalid authorization header")
-        
-        token = authorization.replace("Bearer ", "")
-        user = get_current_user_from_token(token)
-        if not user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
         user_id = user['id']
-        result = update_response_status(response_id, status, user_id)
+        result = await run_db(update_response_status, response_id, status, user_id)
         return result
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/notifications", response_model=List[Notification])
 async def get_user_notifications(
-    authorization: str = Header(None),
-    limit: int = 50
+    response: Response,
+    user: dict = Depends(get_current_user),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None
 ):
     try:
-        if not authorization or not authorization.startswith("Bearer "):
-            raise HTTPException(status_code=401, detail="Invalid authorization header")
-        
-        token = authorization.replace("Bearer ", "")
-        user = get_current_user_from_token(token)
-        if not user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
         user_id = user['id']
-        notifications = get_notifications(user_id, limit)
-        return notifications
+        page = await run_db(get_notifications, user_id, limit, cursor)
+        set_page_headers(response, page)
+        return page.items
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.get("/notifications/unread-count", response_model=dict)
+async def get_unread_count(
+    user: dict = Depends(get_current_user)
+):
+    """Число непрочитанных уведомлений"""
+    count = await run_db(get_unread_notifications_count, user['id'])
+    return {"unread_count": count}
 
+@router.get("/notifications/stream")
+async def stream_notifications(
+    user: dict = Depends(get_current_user),
+    last_event_id: Optional[str] = Header(None)
+):
+    """Новые уведомления через Server-Sent Events вместо периодического опроса.
+
+    После переподключения с Last-Event-ID досылаются пропущенные уведомления.
+    """
+    return StreamingResponse(
+        event_stream(user['id'], parse_last_event_id(last_event_id), user.get('session_id')),
+        media_type="text/event-stream",
+        # X-Accel-Buffering: nginx не должен копить события в буфере
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.put("/notifications/read", response_model=dict)
+async def mark_notifications_as_read(
+    request: NotificationsReadRequest,
+    user: dict = Depends(get_current_user)
+):
+    """Отметить прочитанными уведомления из списка ids или все сразу"""
+    try:
+        return await run_db(mark_notifications_read, user['id'], request.ids)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.put("/notifications/{notification_id}/read", response_model=dict)
 async def mark_notification_as_read(
     notification_id: int,
-    authorization: str = Header(None)
+    user: dict = Depends(get_current_user)
 ):
     try:
-        if not authorization or not authorization.startswith("Bearer "):
-            raise HTTPException(status_code=401, detail="Invalid authorization header")
-        
-        token = authorization.replace("Bearer ", "")
-        user = get_current_user_from_token(token)
-        if not user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
         user_id = user['id']
-        result = mark_notification_read(notification_id, user_id)
+        result = await run_db(mark_notification_read, notification_id, user_id)
         return result
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
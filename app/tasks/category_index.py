@@ -0,0 +1,92 @@
+import os
+import asyncio
+import logging
+import threading
+from typing import Iterable, Set
+from app.database import get_db, run_db
+
+logger = logging.getLogger(__name__)
+
+# Как часто перечитывать service_offers: так доходят изменения, сделанные
+# другими воркерами (свои изменения попадают в индекс сразу)
+CATEGORY_INDEX_REFRESH_INTERVAL = float(os.getenv("ULE_CATEGORY_INDEX_REFRESH", "60"))
+
+class CategoryIndex:
+    """Инвертированный индекс категория -> исполнители по service_offers.
+
+    Хранит и обратное отображение исполнитель -> категории, чтобы заменять
+    набор категорий исполнителя без обхода всех категорий.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._performers = {}
+        self._categories = {}
+        self._stats = {"rebuilds": 0, "updates": 0}
+
+    def rebuild(self, rows: Iterable[tuple]):
+        """Пересобрать индекс из пар (performer_id, category)"""
+        performers, categories = {}, {}
+        for performer_id, category in rows:
+            performers.setdefault(category, set()).add(performer_id)
+            categories.setdefault(performer_id, set()).add(category)
+        with self._lock:
+            self._performers, self._categories = performers, categories
+            self._stats["rebuilds"] += 1
+
+    def set_categories(self, performer_id: int, categories: Iterable[str]):
+        """Заменить категории исполнителя"""
+        new = set(categories)
+        with self._lock:
+            old = self._categories.get(performer_id, set())
+            for category in old - new:
+                performers = self._performers.get(category)
+                if performers is not None:
+                    performers.discard(performer_id)
+                    if not performers:
+                        del self._performers[category]
+            for category in new - old:
+                self._performers.setdefault(category, set()).add(performer_id)
+            if new:
+                self._categories[performer_id] = new
+            else:
+                self._categories.pop(performer_id, None)
+            self._stats["updates"] += 1
+
+    def performers_for(self, category: str) -> Set[int]:
+        with self._lock:
+            return set(self._performers.get(category, ()))
+
+    def categories_for(self, performer_id: int) -> Set[str]:
+        with self._lock:
+            return set(self._categories.get(performer_id, ()))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "categories": len(self._performers),
+                "performers": len(self._categories),
+                "entries": sum(len(performers) for performers in self._performers.values()),
+                **self._stats,
+            }
+
+category_index = CategoryIndex()
+
+def load_category_index():
+    """Построить индекс из service_offers (при старте и периодически)"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT DISTINCT performer_id, category FROM service_offers")
+        category_index.rebuild(cursor.fetchall())
+
+async def category_index_loop():
+    """Фоновая задача: подтягивать изменения service_offers из других воркеров"""
+    while True:
+        await asyncio.sleep(CATEGORY_INDEX_REFRESH_INTERVAL)
+        try:
+            await run_db(load_category_index)
+        except Exception:
+            logger.exception("Category index refresh failed")
+
+def get_category_index_stats() -> dict:
+    return category_index.stats()
@@ -0,0 +1,242 @@
+import os
+import json
+import asyncio
+import logging
+from collections import deque, defaultdict
+from typing import Optional
+from app.database import get_db, run_db
+from app.auth.revocation import is_session_revoked
+
+logger = logging.getLogger(__name__)
+
+# Как часто читать новые уведомления из БД. Чтение по id общее для всех
+# подписчиков воркера; так доходят и уведомления, созданные другими воркерами
+EVENTS_POLL_INTERVAL = float(os.getenv("ULE_EVENTS_POLL_INTERVAL", "1"))
+# Комментарий-пинг, чтобы прокси и браузер не закрыли простаивающее соединение
+EVENTS_HEARTBEAT = float(os.getenv("ULE_EVENTS_HEARTBEAT", "15"))
+# Буфер подписчика: при переполнении выбрасываются самые старые события
+EVENTS_BUFFER_SIZE = int(os.getenv("ULE_EVENTS_BUFFER_SIZE", "100"))
+EVENTS_BATCH_SIZE = 500
+# Сколько пропущенных уведомлений досылать по Last-Event-ID
+EVENTS_RESUME_LIMIT = 200
+# Соединение закрывается через столько секунд, клиент переподключается с
+# Last-Event-ID. Иначе поток живет дольше токена, а uvicorn при остановке
+# ждет завершения всех открытых ответов
+EVENTS_MAX_AGE = float(os.getenv("ULE_EVENTS_MAX_AGE", "300"))
+# Пауза перед переподключением, которую браузер берет из поля retry
+EVENTS_RETRY_MS = 3000
+
+def _row_to_event(row) -> dict:
+    return {"id": row[0], "user_id": row[1], "title": row[2], "message": row[3],
+            "is_read": bool(row[4]), "created_at": row[5]}
+
+def _max_notification_id() -> int:
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM notifications")
+        return cursor.fetchone()[0]
+
+def _fetch_since(last_id: int) -> list:
+    """Уведомления всех пользователей с id больше last_id (по первичному ключу)"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id, user_id, title, message, is_read, created_at FROM notifications
+            WHERE id > ? ORDER BY id LIMIT ?
+        """, (last_id, EVENTS_BATCH_SIZE))
+        return [_row_to_event(row) for row in cursor.fetchall()]
+
+def _fetch_missed(user_id: int, after_id: int, up_to_id: int) -> list:
+    """Уведомления пользователя в диапазоне (after_id, up_to_id] для Last-Event-ID"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id, user_id, title, message, is_read, created_at FROM notifications
+            WHERE user_id = ? AND id > ? AND id <= ? ORDER BY id DESC LIMIT ?
+        """, (user_id, after_id, up_to_id, EVENTS_RESUME_LIMIT))
+        return [_row_to_event(row) for row in reversed(cursor.fetchall())]
+
+def format_event(event: dict) -> str:
+    """Событие в формате text/event-stream"""
+    data = {key: value for key, value in event.items() if key != "user_id"}
+    return f"id: {event['id']}\nevent: notification\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+class Subscriber:
+    """Одно SSE-соединение: ограниченный буфер событий пользователя"""
+
+    def __init__(self, user_id: int, last_id: int, size: int = EVENTS_BUFFER_SIZE):
+        self.user_id = user_id
+        # start_id - граница между досылкой из БД и событиями из буфера
+        self.start_id = last_id
+        self.last_id = last_id
+        self.events = deque(maxlen=size)
+        self.ready = asyncio.Event()
+        self.overflowed = False
+        self.closed = False
+
+    def push(self, event: dict) -> bool:
+        """Положить событие в буфер; False, если пришлось выбросить старое"""
+        if event["id"] <= self.last_id:
+            return True
+        dropped = len(self.events) == self.events.maxlen
+        if dropped:
+            self.overflowed = True
+        self.events.append(event)
+        self.last_id = event["id"]
+        self.ready.set()
+        return not dropped
+
+    def close(self):
+        self.closed = True
+        self.ready.set()
+
+class NotificationHub:
+    """Pub/sub уведомлений внутри процесса.
+
+    Источник событий один - таблица notifications: фоновая задача читает
+    новые строки по id и раскладывает их по подписчикам. Код, записавший
+    уведомление в этом воркере, будит задачу сразу (wake), остальные
+    воркеры увидят строку на следующем опросе.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+        self.last_id = 0
+        self._stats = {"polls": 0, "delivered": 0, "dropped": 0, "connections": 0}
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self.last_id = await run_db(_max_notification_id)
+        self._task = asyncio.create_task(self._poll_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        # Потоки, которые еще открыты, завершаются на следующей итерации
+        for subscribers in self._subscribers.values():
+            for subscriber in subscribers:
+                subscriber.close()
+
+    def wake(self):
+        """Сообщить о новом уведомлении; можно вызывать из потока БД"""
+        loop, wakeup = self._loop, self._wakeup
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(wakeup.set)
+        except RuntimeError:
+            # Цикл событий уже остановлен
+            pass
+
+    def subscribe(self, user_id: int, last_event_id: int = None) -> Subscriber:
+        # Подписчик получает все, что hub прочитает после этого момента;
+        # более ранние уведомления досылаются отдельно через resume
+        subscriber = Subscriber(user_id, self.last_id)
+        if last_event_id is not None and last_event_id > subscriber.last_id:
+            # Опрос в этом воркере отстает от клиента: уже полученное не повторяем
+            subscriber.last_id = last_event_id
+        self._subscribers[user_id].add(subscriber)
+        self._stats["connections"] += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscribers = self._subscribers.get(subscriber.user_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self._subscribers[subscriber.user_id]
+
+    async def resume(self, subscriber: Subscriber, last_event_id: int) -> list:
+        """Уведомления, пропущенные клиентом до подписки"""
+        if last_event_id >= subscriber.start_id:
+            return []
+        return await run_db(_fetch_missed, subscriber.user_id, last_event_id, subscriber.start_id)
+
+    def _dispatch(self, events: list):
+        for event in events:
+            for subscriber in self._subscribers.get(event["user_id"], ()):
+                if not subscriber.push(event):
+                    self._stats["dropped"] += 1
+                self._stats["delivered"] += 1
+        self.last_id = events[-1]["id"]
+
+    async def _poll_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), EVENTS_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                while True:
+                    events = await run_db(_fetch_since, self.last_id)
+                    self._stats["polls"] += 1
+                    if not events:
+                        break
+                    self._dispatch(events)
+                    if len(events) < EVENTS_BATCH_SIZE:
+                        break
+            except Exception:
+                logger.exception("Notification poll failed")
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._subscribers),
+            "subscribers": sum(len(subscribers) for subscribers in self._subscribers.values()),
+            "last_id": self.last_id,
+            **self._stats,
+        }
+
+notification_hub = NotificationHub()
+
+async def event_stream(user_id: int, last_event_id: Optional[int], session_id: str = None):
+    """Тело ответа text/event-stream: подписка живет, пока открыто соединение"""
+    subscriber = notification_hub.subscribe(user_id, last_event_id)
+    deadline = asyncio.get_running_loop().time() + EVENTS_MAX_AGE
+    try:
+        yield f"retry: {EVENTS_RETRY_MS}\n\n"
+        if last_event_id is not None:
+            missed = await notification_hub.resume(subscriber, last_event_id)
+            if len(missed) >= EVENTS_RESUME_LIMIT:
+                # Досылаются только последние - остальное клиент перечитает
+                yield "event: resync\ndata: {}\n\n"
+            for event in missed:
+                yield format_event(event)
+
+        while not subscriber.closed and asyncio.get_running_loop().time() < deadline:
+            if not subscriber.events:
+                subscriber.ready.clear()
+                try:
+                    await asyncio.wait_for(subscriber.ready.wait(), EVENTS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    # Соединение переживает access-токен, поэтому отзыв
+                    # сессии проверяется на каждом пинге
+                    if is_session_revoked(session_id):
+                        break
+                    yield ": ping\n\n"
+                    continue
+            if subscriber.overflowed:
+                # Буфер переполнился и старые события потеряны
+                subscriber.overflowed = False
+                yield "event: resync\ndata: {}\n\n"
+            while subscriber.events:
+                yield format_event(subscriber.events.popleft())
+    finally:
+        notification_hub.unsubscribe(subscriber)
+
+def parse_last_event_id(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+def get_events_stats() -> dict:
+    return notification_hub.stats()
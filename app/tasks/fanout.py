@@ -0,0 +1,56 @@
+import os
+from app.jobs import register_job, enqueue_job, job_queue
+from app.tasks.events import notification_hub
+from app.tasks.category_index import category_index
+
+# Уведомления вставляются пачками: одна транзакция (одно задание) на пачку
+FANOUT_BATCH_SIZE = int(os.getenv("ULE_FANOUT_BATCH_SIZE", "2000"))
+
+NEW_TASK_TITLE = "Новая задача в вашей категории"
+
+def _insert_notifications(cursor, user_ids: list, title: str, message: str):
+    cursor.executemany("""
+        INSERT INTO notifications (user_id, title, message, is_read, created_at)
+        VALUES (?, ?, ?, 0, CURRENT_TIMESTAMP)
+    """, [(user_id, title, message) for user_id in user_ids])
+
+def enqueue_notification(cursor, user_id: int, title: str, message: str, key: str = None):
+    """Уведомить пользователя в фоне; задание пишется в транзакции вызывающего кода"""
+    enqueue_job(cursor, "notification", {"user_id": user_id, "title": title, "message": message}, key=key)
+
+def enqueue_task_alert(cursor, task_id: int, category: str, customer_id: int, title: str):
+    """Поставить рассылку о новой задаче исполнителям ее категории"""
+    enqueue_job(cursor, "task_alert",
+                {"task_id": task_id, "category": category, "customer_id": customer_id, "title": title},
+                key=f"task-alert:{task_id}")
+
+def _notification_job(cursor, payload: dict):
+    _insert_notifications(cursor, [payload["user_id"]], payload["title"], payload["message"])
+
+def _notification_batch_job(cursor, payload: dict):
+    _insert_notifications(cursor, payload["user_ids"], payload["title"], payload["message"])
+
+def _task_alert_job(cursor, payload: dict):
+    """Первая пачка вставляется сразу, остальные - отдельными заданиями.
+
+    Так одна транзакция не держит блокировку записи на время вставки
+    десятков тысяч строк, а упавшая пачка повторяется отдельно.
+    """
+    performer_ids = sorted(category_index.performers_for(payload["category"]) - {payload["customer_id"]})
+    batches = [performer_ids[start:start + FANOUT_BATCH_SIZE]
+               for start in range(0, len(performer_ids), FANOUT_BATCH_SIZE)]
+    if not batches:
+        return
+    _insert_notifications(cursor, batches[0], NEW_TASK_TITLE, payload["title"])
+    for number, batch in enumerate(batches[1:], start=1):
+        enqueue_job(cursor, "notification_batch",
+                    {"user_ids": batch, "title": NEW_TASK_TITLE, "message": payload["title"]},
+                    key=f"task-alert:{payload['task_id']}:{number}")
+
+def _after_task_alert():
+    notification_hub.wake()
+    job_queue.wake()
+
+register_job("notification", _notification_job, after_commit=notification_hub.wake)
+register_job("notification_batch", _notification_batch_job, after_commit=notification_hub.wake)
+register_job("task_alert", _task_alert_job, after_commit=_after_task_alert)
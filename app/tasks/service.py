@@ -1,22 +1,33 @@
+import re
+import heapq
+import sqlite3
 import uuid
 import json
+import base64
+from collections import namedtuple
 from typing import Dict, List, Optional
 from datetime import datetime
+from pydantic import TypeAdapter
 from app.database import get_db
+from app.cache import response_cache, read_table_versions, make_etag, parse_db_timestamp
+from app.photos.service import normalize_photo_ref, replace_task_photos, load_task_photos
+from app.tasks.category_index import category_index
+from app.jobs import job_queue
+from app.tasks.fanout import enqueue_notification, enqueue_task_alert
 from app.models import (
-    TaskCreate, TaskResponse, TaskUpdate, TaskStatus,
+    TaskCreate, TaskResponse, TaskUpdate, TaskStatus, TaskPage, NotificationPage,
     ServiceOffer as ServiceOfferModel, ProjectResponse as ProjectResponseModel, 
-    ProjectResponseCreate, Notification as NotificationModel
+    ProjectResponseCreate, ResponseStatus, Notification as NotificationModel
 )
 
 def create_task(task_data: TaskCreate, customer_id: int) -> dict:
     """Создать новую задачу"""
+    # Фотографии хранятся в файловом хранилище, в БД - только ссылки
+    photo_refs = [normalize_photo_ref(photo) for photo in task_data.photos or []]
+    
     with get_db() as conn:
         cursor = conn.cursor()
         
-        # Обрабатываем фотографии - сериализуем список в JSON строку
-        photos_str = json.dumps(task_data.photos) if task_data.photos else None
-        
         # Если цена не указана, устанавливаем 0
         price = task_data.price if task_data.price is not None else 0.0
         
@@ -24,7 +35,7 @@ def create_task(task_data: TaskCreate, customer_id: int) -> dict:
         title = task_data.description[:50] + "..." if len(task_data.description) > 50 else task_data.description
         
         cursor.execute("""
-            INSERT INTO tasks (title, description, category, address, date, price, photos, status, customer_id)
+            INSERT INTO tasks (title, description, category, address, date, date_sort, price, status, customer_id)
             VALUES (?, ?, ?, ?, ?, ?, ?, 'open', ?)
         """, (
             title,
@@ -32,78 +43,380 @@ def create_task(task_data: TaskCreate, customer_id: int) -> dict:
             task_data.service_category.value,  # Используем .value для enum
             task_data.address,
             task_data.date,
+            parse_task_date(task_data.date),
             price,
-            photos_str,
             customer_id
         ))
         
         task_id = cursor.lastrowid
+        replace_task_photos(cursor, task_id, photo_refs)
+        # Исполнители категории уведомляются в фоне
+        enqueue_task_alert(cursor, task_id, task_data.service_category.value, customer_id, title)
         conn.commit()
         
-        return {"success": True, "task_id": task_id, "message": "Task created successfully"}
+    job_queue.wake()
+    return {"success": True, "task_id": task_id, "message": "Task created successfully"}
+
+# Колонки задачи в порядке, который ожидает _row_to_task
+TASK_COLUMNS = "t.id, t.title, t.description, t.category, t.address, t.date, t.price, t.status, u.phone as customer_phone, t.created_at, t.responses_count, t.date_sort"
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Сортировки списка задач: выражение, направление и индекс колонки в TASK_COLUMNS
+TASK_SORTS = {
+    "newest": ("t.created_at", "DESC", 9),
+    "oldest": ("t.created_at", "ASC", 9),
+    "price_asc": ("t.price", "ASC", 6),
+    "price_desc": ("t.price", "DESC", 6),
+    "date_asc": ("t.date_sort", "ASC", 11),
+}
+
+# Задачи без распознаваемой даты в сортировке по дате идут последними
+UNKNOWN_TASK_DATE = "9999-12-31"
+_TASK_DATE_FORMATS = ("%Y-%m-%d", "%Y-%m-%dT%H:%M", "%Y-%m-%d %H:%M", "%d.%m.%Y", "%d.%m.%y", "%d/%m/%Y")
+
+def parse_task_date(value: Optional[str]) -> str:
+    """Привести свободный текст даты задачи к сортируемому виду YYYY-MM-DD"""
+    text = (value or "").strip()
+    for fmt in _TASK_DATE_FORMATS:
+        try:
+            return datetime.strptime(text[:16], fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return UNKNOWN_TASK_DATE
+
+def backfill_task_dates(batch_size: int = 500) -> int:
+    """Заполнить date_sort для задач, созданных до появления колонки"""
+    updated = 0
+    while True:
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, date FROM tasks WHERE date_sort IS NULL LIMIT ?", (batch_size,))
+            rows = cursor.fetchall()
+            if not rows:
+                return updated
+            cursor.executemany(
+                "UPDATE tasks SET date_sort = ? WHERE id = ?",
+                [(parse_task_date(date), task_id) for task_id, date in rows]
+            )
+            conn.commit()
+            updated += len(rows)
 
-def get_tasks(customer_id: int = None, category: str = None, status: str = None) -> List[TaskResponse]:
-    """Получить список задач"""
+def encode_cursor(*values) -> str:
+    """Упаковать ключ последней строки страницы в непрозрачный курсор"""
+    raw = json.dumps(values, separators=(",", ":"), ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, size: int = 2) -> list:
+    """Распаковать курсор, полученный от encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    # Значения идут прямо в параметры SQL: только скаляры (bool - подкласс int)
+    if any(isinstance(value, bool) or not isinstance(value, (str, int, float)) for value in values):
+        raise ValueError("Invalid cursor")
+    return values
+
+def _row_to_task(task, photos: List[str]) -> TaskResponse:
+    return TaskResponse(
+        id=str(task[0]),  # id как строка
+        service_category=task[3],  # category
+        description=task[2],  # description
+        address=task[4],  # address
+        date=task[5],  # date
+        price=task[6],  # price
+        photos=photos,  # только URL фотографий из task_photos
+        status=task[7],  # status
+        customer_phone=task[8],  # customer_phone (из JOIN)
+        created_at=datetime.fromisoformat(task[9]) if isinstance(task[9], str) else task[9],  # created_at
+        responses_count=task[10]  # responses_count (поддерживается триггерами)
+    )
+
+def get_tasks(customer_id: int = None, category: str = None, status: str = None,
+              min_price: float = None, max_price: float = None,
+              date_from: str = None, date_to: str = None, city: str = None,
+              sort: str = "newest", limit: int = DEFAULT_PAGE_SIZE, cursor: str = None,
+              include_total: bool = False) -> TaskPage:
+    """Получить страницу задач (keyset-пагинация по ключу сортировки и id)"""
+    if sort not in TASK_SORTS:
+        raise ValueError("Invalid sort order")
+    sort_column, direction, sort_index = TASK_SORTS[sort]
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    
     with get_db() as conn:
-        cursor = conn.cursor()
+        db_cursor = conn.cursor()
         
-        query = "SELECT t.id, t.title, t.description, t.category, t.address, t.date, t.price, t.photos, t.status, u.phone as customer_phone, t.created_at FROM tasks t JOIN users u ON t.customer_id = u.id WHERE 1=1"
+        where = " WHERE 1=1"
         params = []
         
         if customer_id:
-            query += " AND t.customer_id = ?"
+            where += " AND t.customer_id = ?"
             params.append(customer_id)
         if category:
-            query += " AND t.category = ?"
+            where += " AND t.category = ?"
             params.append(category)
         if status:
-            query += " AND t.status = ?"
+            where += " AND t.status = ?"
             params.append(status)
+        if min_price is not None:
+            where += " AND t.price >= ?"
+            params.append(min_price)
+        if max_price is not None:
+            where += " AND t.price <= ?"
+            params.append(max_price)
+        if date_from:
+            where += " AND t.date_sort >= ? AND t.date_sort <> ?"
+            params.extend([date_from, UNKNOWN_TASK_DATE])
+        if date_to:
+            where += " AND t.date_sort <= ?"
+            params.append(date_to)
+        if city:
+            # У задачи нет своего города - фильтруем по городу заказчика
+            where += " AND u.city = ?"
+            params.append(city)
+        
+        base = " FROM tasks t JOIN users u ON t.customer_id = u.id" + where
+        
+        total_estimate = None
+        if include_total:
+            db_cursor.execute("SELECT COUNT(*)" + base, params)
+            total_estimate = db_cursor.fetchone()[0]
+        
+        query = f"SELECT {TASK_COLUMNS}" + base
+        if cursor:
+            # Продолжаем строго после последней строки предыдущей страницы
+            last_value, last_id = decode_cursor(cursor)
+            query += f" AND ({sort_column}, t.id) {'<' if direction == 'DESC' else '>'} (?, ?)"
+            params.extend([last_value, last_id])
+        
+        # Берем на одну строку больше, чтобы понять, есть ли следующая страница
+        query += f" ORDER BY {sort_column} {direction}, t.id {direction} LIMIT ?"
+        params.append(limit + 1)
+        
+        db_cursor.execute(query, params)
+        tasks = db_cursor.fetchall()
+        
+        next_cursor = None
+        if len(tasks) > limit:
+            tasks = tasks[:limit]
+            next_cursor = encode_cursor(tasks[-1][sort_index], tasks[-1][0])
+        
+        photos = load_task_photos(db_cursor, [task[0] for task in tasks])
+        return TaskPage(
+            items=[_row_to_task(task, photos[task[0]]) for task in tasks],
+            next_cursor=next_cursor,
+            total_estimate=total_estimate
+        )
+
+def get_task_feed(performer_id: int, limit: int = DEFAULT_PAGE_SIZE, cursor: str = None) -> TaskPage:
+    """Открытые задачи в категориях исполнителя, новые сначала.
+
+    По каждой категории - отдельный диапазон индекса (status, category,
+    created_at, id); отсортированные потоки сливаются без общей сортировки.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    categories = sorted(category_index.categories_for(performer_id))
+    if not categories:
+        return TaskPage(items=[])
+    
+    query = f"""
+        SELECT {TASK_COLUMNS} FROM tasks t JOIN users u ON t.customer_id = u.id
+        WHERE t.status = 'open' AND t.category = ? AND t.customer_id <> ?
+    """
+    params = [performer_id]
+    if cursor:
+        last_created_at, last_id = decode_cursor(cursor)
+        query += " AND (t.created_at, t.id) < (?, ?)"
+        params.extend([last_created_at, last_id])
+    query += " ORDER BY t.created_at DESC, t.id DESC LIMIT ?"
+    params.append(limit + 1)
+    
+    with get_db() as conn:
+        db_cursor = conn.cursor()
         
-        query += " ORDER BY t.created_at DESC"
+        streams = []
+        for category in categories:
+            db_cursor.execute(query, [category] + params)
+            streams.append(db_cursor.fetchall())
         
-        cursor.execute(query, params)
-        tasks = cursor.fetchall()
+        merged = heapq.merge(*streams, key=lambda task: (task[9], task[0]), reverse=True)
+        tasks = [task for _, task in zip(range(limit + 1), merged)]
         
-        result = []
-        for task in tasks:
-            # Получаем количество откликов
-            cursor.execute("SELECT COUNT(*) FROM project_responses WHERE task_id = ?", (task[0],))  # id находится в первом элементе
-            responses_count = cursor.fetchone()[0]
-            
-            # Обрабатываем фотографии - десериализуем JSON строку в список
-            photos = []
-            if task[7]:  # photos
-                try:
-                    photos = json.loads(task[7])
-                except (json.JSONDecodeError, TypeError):
-                    photos = []
-            else:
-                photos = []
-            
-            result.append(TaskResponse(
-                id=str(task[0]),  # id как строка
-                service_category=task[3],  # category
-                description=task[2],  # description
-                address=task[4],  # address
-                date=task[5],  # date
-                price=task[6],  # price
-                photos=photos,  # обработанный список фотографий
-                status=task[8],  # status
-                customer_phone=task[9],  # customer_phone (из JOIN)
-                created_at=datetime.fromisoformat(task[10]) if isinstance(task[10], str) else task[10],  # created_at
-                responses_count=responses_count
-            ))
+        next_cursor = None
+        if len(tasks) > limit:
+            tasks = tasks[:limit]
+            next_cursor = encode_cursor(tasks[-1][9], tasks[-1][0])
         
-        return result
+        photos = load_task_photos(db_cursor, [task[0] for task in tasks])
+        return TaskPage(
+            items=[_row_to_task(task, photos[task[0]]) for task in tasks],
+            next_cursor=next_cursor
+        )
+
+# Готовая страница списка задач: тело JSON и значения заголовков пагинации
+CachedPage = namedtuple("CachedPage", "body next_cursor total_estimate")
+
+_task_list_adapter = TypeAdapter(List[TaskResponse])
+
+def get_open_tasks_cached(**filters) -> CachedPage:
+    """Страница открытых задач (/tasks/available) из кеша ответов.
+
+    Ключ - набор фильтров; в кеше хранится уже сериализованный JSON, так
+    что при попадании не выполняются ни JOIN, ни сборка моделей.
+    """
+    def build() -> CachedPage:
+        page = get_tasks(status=TaskStatus.OPEN.value, **filters)
+        return CachedPage(_task_list_adapter.dump_json(page.items), page.next_cursor, page.total_estimate)
+    
+    key = ("tasks/available",) + tuple(sorted(filters.items()))
+    return response_cache.get_or_build(key, ("tasks", "users"), build, sizeof=lambda page: len(page.body))
+
+# Границы ценовых диапазонов для фасетов (руб.)
+PRICE_BUCKETS = (1000, 3000, 5000, 10000, 30000)
+
+def get_task_facets(category: str = None) -> dict:
+    """Количество открытых задач по категориям и ценовым диапазонам"""
+    # Запись кеша живет до первого изменения задач в любом воркере
+    return response_cache.get_or_build(("facets", category), ("tasks",),
+                                       lambda: _build_task_facets(category))
+
+def _build_task_facets(category: str = None) -> dict:
+    with get_db() as conn:
+        cursor = conn.cursor()
+        
+        # Оба запроса читают только индекс (status, category, price)
+        cursor.execute("""
+            SELECT category, COUNT(*) FROM tasks
+            WHERE status = 'open'
+            GROUP BY category
+        """)
+        categories = {row[0]: row[1] for row in cursor.fetchall()}
+        
+        bucket_case = " ".join(
+            f"WHEN price < {bound} THEN {index}" for index, bound in enumerate(PRICE_BUCKETS)
+        )
+        query = f"""
+            SELECT CASE {bucket_case} ELSE {len(PRICE_BUCKETS)} END AS bucket, COUNT(*)
+            FROM tasks
+            WHERE status = 'open'
+        """
+        params = []
+        if category:
+            query += " AND category = ?"
+            params.append(category)
+        query += " GROUP BY bucket"
+        cursor.execute(query, params)
+        bucket_counts = dict(cursor.fetchall())
+    
+    bounds = (0,) + PRICE_BUCKETS + (None,)
+    price_buckets = [
+        {"min": bounds[index], "max": bounds[index + 1], "count": bucket_counts.get(index, 0)}
+        for index in range(len(bounds) - 1)
+    ]
+    return {
+        "total": sum(categories.values()),
+        "categories": categories,
+        "price_buckets": price_buckets
+    }
+
+# Веса колонок для bm25: совпадение в заголовке важнее, чем в адресе
+SEARCH_WEIGHTS = (10.0, 5.0, 2.0)
+MIN_STEM_LENGTH = 4
+
+# Типичные окончания русских слов: отбрасываются перед префиксным поиском,
+# чтобы "окна", "окно" и "окнами" находили друг друга
+_RU_ENDINGS = sorted([
+    "ами", "ями", "ого", "его", "ому", "ему", "ыми", "ими", "ией", "ием",
+    "иях", "ах", "ях", "ов", "ев", "ей", "ой", "ый", "ий", "ая", "яя",
+    "ое", "ее", "ые", "ие", "ом", "ем", "ам", "ям", "ую", "юю", "ть",
+    "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й",
+], key=len, reverse=True)
+
+def _stem_token(token: str) -> str:
+    for ending in _RU_ENDINGS:
+        if token.endswith(ending) and len(token) - len(ending) >= MIN_STEM_LENGTH - 1:
+            return token[:-len(ending)]
+    return token
+
+def build_fts_query(text: str) -> str:
+    """Преобразовать пользовательский ввод в безопасный запрос FTS5 с префиксами"""
+    tokens = re.findall(r"\w+", text.lower().replace("ё", "е"))
+    terms = []
+    for token in tokens[:10]:
+        stem = _stem_token(token) if len(token) >= MIN_STEM_LENGTH else token
+        # Каждое слово в кавычках: спецсинтаксис FTS5 из ввода не интерпретируется
+        terms.append('"' + stem.replace('"', '') + '"*')
+    return " ".join(terms)
+
+def search_tasks(query: str, category: str = None, status: str = None,
+                 min_price: float = None, max_price: float = None,
+                 limit: int = DEFAULT_PAGE_SIZE, cursor: str = None) -> TaskPage:
+    """Полнотекстовый поиск задач с ранжированием bm25"""
+    fts_query = build_fts_query(query or "")
+    if not fts_query:
+        raise ValueError("Search query is empty")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    
+    with get_db() as conn:
+        db_cursor = conn.cursor()
+        
+        # bm25 меньше - совпадение лучше
+        rank = "bm25(tasks_fts, %s, %s, %s)" % SEARCH_WEIGHTS
+        query_sql = f"""
+            SELECT {TASK_COLUMNS}, {rank} AS score
+            FROM tasks_fts
+            JOIN tasks t ON t.id = tasks_fts.rowid
+            JOIN users u ON t.customer_id = u.id
+            WHERE tasks_fts MATCH ?
+        """
+        params = [fts_query]
+        
+        if category:
+            query_sql += " AND t.category = ?"
+            params.append(category)
+        if status:
+            query_sql += " AND t.status = ?"
+            params.append(status)
+        if min_price is not None:
+            query_sql += " AND t.price >= ?"
+            params.append(min_price)
+        if max_price is not None:
+            query_sql += " AND t.price <= ?"
+            params.append(max_price)
+        if cursor:
+            last_score, last_id = decode_cursor(cursor)
+            query_sql += f" AND ({rank}, t.id) > (?, ?)"
+            params.extend([last_score, last_id])
+        
+        query_sql += " ORDER BY score, t.id LIMIT ?"
+        params.append(limit + 1)
+        
+        db_cursor.execute(query_sql, params)
+        tasks = db_cursor.fetchall()
+        
+        next_cursor = None
+        if len(tasks) > limit:
+            tasks = tasks[:limit]
+            next_cursor = encode_cursor(tasks[-1][-1], tasks[-1][0])
+        
+        photos = load_task_photos(db_cursor, [task[0] for task in tasks])
+        return TaskPage(
+            items=[_row_to_task(task, photos[task[0]]) for task in tasks],
+            next_cursor=next_cursor
+        )
 
 def get_task(task_id: int) -> Optional[TaskResponse]:
     """Получить задачу по ID"""
     with get_db() as conn:
         cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT t.id, t.title, t.description, t.category, t.address, t.date, t.price, t.photos, t.status, u.phone as customer_phone, t.created_at
+        cursor.execute(f"""
+            SELECT {TASK_COLUMNS}
             FROM tasks t 
             JOIN users u ON t.customer_id = u.id 
             WHERE t.id = ?
@@ -113,36 +426,39 @@ def get_task(task_id: int) -> Optional[TaskResponse]:
         if not task:
             return None
         
-        # Получаем количество откликов
-        cursor.execute("SELECT COUNT(*) FROM project_responses WHERE task_id = ?", (task_id,))
-        responses_count = cursor.fetchone()[0]
-        
-        # Обрабатываем фотографии - десериализуем JSON строку в список
-        photos = []
-        if task[7]:  # photos
-            try:
-                photos = json.loads(task[7])
-            except (json.JSONDecodeError, TypeError):
-                photos = []
-        else:
-            photos = []
-        
-        return TaskResponse(
-            id=str(task[0]),  # id как строка
-            service_category=task[3],  # category
-            description=task[2],  # description
-            address=task[4],  # address
-            date=task[5],  # date
-            price=task[6],  # price
-            photos=photos,  # обработанный список фотографий
-            status=task[8],  # status
-            customer_phone=task[9],  # customer_phone (из JOIN)
-            created_at=datetime.fromisoformat(task[10]) if isinstance(task[10], str) else task[10],  # created_at
-            responses_count=responses_count
-        )
+        photos = load_task_photos(cursor, [task[0]])
+        return _row_to_task(task, photos[task[0]])
+
+def get_task_validators(task_id: int) -> Optional[tuple]:
+    """ETag и Last-Modified задачи без загрузки ее данных.
+
+    Версия растет при каждом изменении задачи, счетчик откликов меняют
+    триггеры; телефон заказчика входит в ответ и тоже учитывается.
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT t.version, t.responses_count, COALESCE(t.updated_at, t.created_at), u.phone
+            FROM tasks t
+            JOIN users u ON t.customer_id = u.id
+            WHERE t.id = ?
+        """, (task_id,))
+        row = cursor.fetchone()
+    if not row:
+        return None
+    version, responses_count, updated_at, customer_phone = row
+    return make_etag("task", task_id, version, responses_count, customer_phone), parse_db_timestamp(updated_at)
+
+def get_table_etag(tables: tuple, *parts) -> str:
+    """ETag списка по версиям таблиц, из которых он строится"""
+    return make_etag(tables, read_table_versions(tables), *parts)
 
 def update_task(task_id: int, task_data: TaskUpdate, customer_id: int) -> dict:
     """Обновить задачу"""
+    photo_refs = None
+    if task_data.photos is not None:
+        photo_refs = [normalize_photo_ref(photo) for photo in task_data.photos]
+    
     with get_db() as conn:
         cursor = conn.cursor()
         
@@ -168,14 +484,16 @@ def update_task(task_id: int, task_data: TaskUpdate, customer_id: int) -> dict:
             values.append(task_data.address)
         if task_data.date is not None:
             update_fields.append("date = ?")
+            update_fields.append("date_sort = ?")
             values.append(task_data.date)
+            values.append(parse_task_date(task_data.date))
         if task_data.price is not None:
             update_fields.append("price = ?")
             values.append(task_data.price)
-        if task_data.photos is not None:
-            update_fields.append("photos = ?")
-            photos_str = json.dumps(task_data.photos) if task_data.photos else None
-            values.append(photos_str)
+        if photo_refs is not None:
+            replace_task_photos(cursor, task_id, photo_refs)
+            # updated_at меняется и тогда, когда изменились только фотографии
+            update_fields.append("photos = NULL")
         if task_data.status is not None:
             update_fields.append("status = ?")
             values.append(task_data.status.value)  # Используем .value для enum
@@ -183,8 +501,9 @@ def update_task(task_id: int, task_data: TaskUpdate, customer_id: int) -> dict:
         if not update_fields:
             return {"success": True, "message": "No fields to update"}
         
-        # Добавляем updated_at
+        # Добавляем updated_at и новую версию
         update_fields.append("updated_at = CURRENT_TIMESTAMP")
+        update_fields.append("version = version + 1")
         values.append(task_id)
         
         # Выполняем обновление
@@ -204,8 +523,9 @@ def delete_task(task_id: int, customer_id: int) -> dict:
         if not cursor.fetchone():
             raise ValueError("Task not found or access denied")
         
-        # Удаляем связанные отклики
+        # Удаляем связанные отклики и ссылки на фотографии
         cursor.execute("DELETE FROM project_responses WHERE task_id = ?", (task_id,))
+        cursor.execute("DELETE FROM task_photos WHERE task_id = ?", (task_id,))
         
         # Удаляем задачу
         cursor.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
@@ -213,53 +533,66 @@ def delete_task(task_id: int, customer_id: int) -> dict:
         
         return {"success": True, "message": "Task deleted successfully"}
 
-def create_service_offer(performer_id: int, category: str, description: str = None, hourly_rate: float = None) -> dict:
-    """Создать предложение услуг"""
-    print(f"Creating service offer: performer_id={performer_id}, category={category}, description={description}, hourly_rate={hourly_rate}")
+def replace_service_offers(performer_id: int, categories: List[str],
+                           description: str = None, hourly_rate: float = None) -> dict:
+    """Заменить набор категорий исполнителя одной транзакцией.
+
+    Сравнивает с текущими строками и удаляет/добавляет только разницу;
+    возвращает итоговый набор в формате get_service_offer.
+    """
+    categories = list(dict.fromkeys(categories))
     
     with get_db() as conn:
         cursor = conn.cursor()
+        # Блокировка записи до чтения: параллельное сохранение того же
+        # исполнителя не увидит промежуточный набор
+        cursor.execute("BEGIN IMMEDIATE")
         
-        # Создаем новое предложение (не удаляем существующие здесь)
+        cursor.execute("SELECT category FROM service_offers WHERE performer_id = ?", (performer_id,))
+        existing = {row[0] for row in cursor.fetchall()}
+        
+        removed = existing - set(categories)
+        added = [category for category in categories if category not in existing]
+        
+        cursor.executemany(
+            "DELETE FROM service_offers WHERE performer_id = ? AND category = ?",
+            [(performer_id, category) for category in removed]
+        )
+        # Описание и ставка общие для всех категорий исполнителя
         cursor.execute("""
+            UPDATE service_offers SET description = ?, hourly_rate = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE performer_id = ? AND (description IS NOT ? OR hourly_rate IS NOT ?)
+        """, (description, hourly_rate, performer_id, description, hourly_rate))
+        cursor.executemany("""
             INSERT INTO service_offers (performer_id, category, description, hourly_rate, created_at, updated_at)
             VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-        """, (performer_id, category, description, hourly_rate))
-        
-        offer_id = cursor.lastrowid
+        """, [(performer_id, category, description, hourly_rate) for category in added])
         conn.commit()
-        print(f"Created service offer with ID: {offer_id}")
-        
-        return {"success": True, "offer_id": offer_id, "message": "Service offer created successfully"}
+    
+    category_index.set_categories(performer_id, categories)
+    return {
+        "service_categories": categories,
+        "description": description,
+        "hourly_rate": hourly_rate
+    }
 
 def get_service_offer(performer_id: int) -> dict:
     """Получить предложения услуг исполнителя"""
-    print(f"Getting service offers for performer_id: {performer_id}")
-    
     with get_db() as conn:
         cursor = conn.cursor()
         
-        # Проверяем, сколько всего записей в таблице
-        cursor.execute("SELECT COUNT(*) FROM service_offers")
-        total_count = cursor.fetchone()[0]
-        print(f"Total records in service_offers table: {total_count}")
-        
         cursor.execute("""
             SELECT category, description, hourly_rate FROM service_offers 
             WHERE performer_id = ?
         """, (performer_id,))
         
         offers = cursor.fetchall()
-        print(f"Database offers for performer {performer_id}: {offers}")
-        print(f"Number of offers found: {len(offers)}")
         
         if not offers:
-            print("No offers found, returning empty categories")
             return {"service_categories": []}
         
         # Группируем все категории в один объект
         categories = [offer[0] for offer in offers]
-        print(f"Extracted categories: {categories}")
         description = offers[0][1] if offers else None
         hourly_rate = offers[0][2] if offers else None
         
@@ -268,7 +601,6 @@ def get_service_offer(performer_id: int) -> dict:
             "description": description,
             "hourly_rate": hourly_rate
         }
-        print(f"Returning result: {result}")
         return result
 
 def update_service_offer(offer_id: int, performer_id: int, **kwargs) -> dict:
@@ -309,38 +641,43 @@ def create_project_response(task_id: int, performer_id: int, response_data: Proj
     with get_db() as conn:
         cursor = conn.cursor()
         
-        # Проверяем, что задача существует
-        cursor.execute("SELECT customer_id FROM tasks WHERE id = ?", (task_id,))
-        task = cursor.fetchone()
-        if not task:
-            raise ValueError("Task not found")
-        
-        # Проверяем, что исполнитель не является заказчиком
-        if task[0] == performer_id:  # customer_id находится в первом элементе
-            raise ValueError("Cannot respond to your own task")
-        
-        # Проверяем, что отклик еще не существует
-        cursor.execute("SELECT id FROM project_responses WHERE task_id = ? AND performer_id = ?", (task_id, performer_id))
-        if cursor.fetchone():
+        # Один INSERT ... SELECT: строка появится, только если задача открыта
+        # и принадлежит другому пользователю; повтор отсекает уникальный индекс
+        try:
+            cursor.execute("""
+                INSERT INTO project_responses (task_id, performer_id, offer_price, message, status, created_at, updated_at)
+                SELECT id, ?, ?, ?, 'pending', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP FROM tasks
+                WHERE id = ? AND status = 'open' AND customer_id <> ?
+                RETURNING id, (SELECT customer_id FROM tasks WHERE tasks.id = project_responses.task_id)
+            """, (performer_id, response_data.offer_price, response_data.message, task_id, performer_id))
+            response = cursor.fetchone()
+        except sqlite3.IntegrityError:
             raise ValueError("Response already exists")
         
-        # Создаем отклик
-        cursor.execute("""
-            INSERT INTO project_responses (task_id, performer_id, offer_price, message, status, created_at, updated_at)
-            VALUES (?, ?, ?, ?, 'pending', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-        """, (task_id, performer_id, response_data.offer_price, response_data.message))
-        
-        response_id = cursor.lastrowid
-        conn.commit()
-        
-        # Создаем уведомление для заказчика
-        create_notification(
-            user_id=task[0],  # customer_id находится в первом элементе
+        if response is None:
+            # Причина отказа нужна только на этом редком пути
+            cursor.execute("SELECT customer_id, status FROM tasks WHERE id = ?", (task_id,))
+            task = cursor.fetchone()
+            if not task:
+                raise ValueError("Task not found")
+            if task[0] == performer_id:
+                raise ValueError("Cannot respond to your own task")
+            raise ValueError("Task is not open")
+        
+        response_id, customer_id = response
+        
+        # Уведомление заказчику создается в фоне, вместе с откликом
+        enqueue_notification(
+            cursor,
+            user_id=customer_id,
             title="Новый отклик на задачу",
-            message=f"Получен новый отклик на вашу задачу от исполнителя"
+            message="Получен новый отклик на вашу задачу от исполнителя",
+            key=f"response-created:{response_id}"
         )
-        
-        return {"success": True, "response_id": response_id, "message": "Response created successfully"}
+        conn.commit()
+    
+    job_queue.wake()
+    return {"success": True, "response_id": response_id, "message": "Response created successfully"}
 
 def get_task_responses(task_id: int, customer_id: int) -> List[ProjectResponseModel]:
     """Получить отклики на задачу"""
@@ -375,71 +712,114 @@ def get_task_responses(task_id: int, customer_id: int) -> List[ProjectResponseMo
         
         return result
 
+# Решение по отклику: pending -> accepted | rejected
+RESPONSE_STATUS_MESSAGES = {
+    "accepted": "Ваш отклик принят заказчиком",
+    "rejected": "Ваш отклик отклонен заказчиком",
+}
+
 def update_response_status(response_id: int, status: str, customer_id: int) -> dict:
-    """Обновить статус отклика"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        
-        # Проверяем, что отклик существует и заказчик является владельцем задачи
-        cursor.execute("""
-            SELECT pr.id FROM project_responses pr 
-            JOIN tasks t ON pr.task_id = t.id 
-            WHERE pr.id = ? AND t.customer_id = ?
-        """, (response_id, customer_id))
-        
-        if not cursor.fetchone():
-            raise ValueError("Response not found or access denied")
-        
-        # Обновляем статус
-        cursor.execute("""
-            UPDATE project_responses 
-            SET status = ?, updated_at = CURRENT_TIMESTAMP 
-            WHERE id = ?
-        """, (status, response_id))
-        
-        conn.commit()
-        
-        # Создаем уведомление для исполнителя
-        cursor.execute("SELECT performer_id FROM project_responses WHERE id = ?", (response_id,))
-        performer_result = cursor.fetchone()
-        performer_id = performer_result[0]  # performer_id находится в первом элементе
-        
-        create_notification(
-            user_id=performer_id,
-            title="Статус отклика изменен",
-            message=f"Статус вашего отклика изменен на: {status}"
-        )
-        
-        return {"success": True, "message": "Response status updated successfully"}
+    """Принять или отклонить отклик.
 
-def create_notification(user_id: int, title: str, message: str) -> dict:
-    """Создать уведомление"""
+    Все изменения - одна транзакция BEGIN IMMEDIATE: при принятии задача
+    переходит в in_progress, остальные ожидающие отклики отклоняются,
+    уведомления ставятся в очередь заданий.
+    """
+    status = ResponseStatus(status).value
+    if status not in RESPONSE_STATUS_MESSAGES:
+        raise ValueError("Invalid status transition")
+    
     with get_db() as conn:
         cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
         
+        # Проверка владельца, состояния отклика и задачи входит в условие UPDATE;
+        # версия задачи возвращается для оптимистичной проверки ниже
         cursor.execute("""
-            INSERT INTO notifications (user_id, title, message, is_read, created_at)
-            VALUES (?, ?, ?, 0, CURRENT_TIMESTAMP)
-        """, (user_id, title, message))
-        
-        notification_id = cursor.lastrowid
+            UPDATE project_responses SET status = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status = 'pending'
+              AND task_id IN (SELECT id FROM tasks WHERE customer_id = ? AND status = 'open')
+            RETURNING task_id, performer_id, (SELECT version FROM tasks WHERE tasks.id = project_responses.task_id)
+        """, (status, response_id, customer_id))
+        response = cursor.fetchone()
+        if response is None:
+            # Причина отказа нужна только на этом редком пути
+            cursor.execute("""
+                SELECT pr.status, t.status FROM project_responses pr
+                JOIN tasks t ON pr.task_id = t.id
+                WHERE pr.id = ? AND t.customer_id = ?
+            """, (response_id, customer_id))
+            row = cursor.fetchone()
+            if not row:
+                raise ValueError("Response not found or access denied")
+            if row[0] != 'pending':
+                raise ValueError("Response has already been decided")
+            raise ValueError("Task is not open")
+        
+        task_id, performer_id, version = response
+        notify = [(performer_id, status)]
+        
+        if status == 'accepted':
+            # Параллельное принятие другого отклика изменит версию - второе не пройдет
+            cursor.execute("""
+                UPDATE tasks SET status = 'in_progress', version = version + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND version = ? AND status = 'open'
+            """, (task_id, version))
+            if cursor.rowcount == 0:
+                raise ValueError("Task was modified concurrently")
+            
+            cursor.execute("""
+                UPDATE project_responses SET status = 'rejected', updated_at = CURRENT_TIMESTAMP
+                WHERE task_id = ? AND id <> ? AND status = 'pending'
+                RETURNING performer_id
+            """, (task_id, response_id))
+            notify.extend((row[0], 'rejected') for row in cursor.fetchall())
+        
+        for user_id, decision in notify:
+            enqueue_notification(
+                cursor,
+                user_id=user_id,
+                title="Статус отклика изменен",
+                message=RESPONSE_STATUS_MESSAGES[decision],
+                key=f"response-decision:{task_id}:{user_id}"
+            )
         conn.commit()
-        
-        return {"success": True, "notification_id": notification_id, "message": "Notification created successfully"}
+    
+    job_queue.wake()
+    return {
+        "success": True,
+        "message": "Response status updated successfully",
+        "status": status,
+        "task_status": "in_progress" if status == 'accepted' else "open",
+        "rejected_count": len(notify) - 1
+    }
 
-def get_notifications(user_id: int, limit: int = 50) -> List[NotificationModel]:
-    """Получить уведомления пользователя"""
+def get_notifications(user_id: int, limit: int = DEFAULT_PAGE_SIZE, cursor: str = None) -> NotificationPage:
+    """Получить страницу уведомлений пользователя"""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    
     with get_db() as conn:
-        cursor = conn.cursor()
+        db_cursor = conn.cursor()
         
-        cursor.execute("""
+        query = """
             SELECT n.id, n.title, n.message, n.is_read, n.created_at FROM notifications n 
-            WHERE n.user_id = ? 
-            ORDER BY n.created_at DESC 
-            LIMIT ?
-        """, (user_id, limit))
-        
-        notifications = cursor.fetchall()
+            WHERE n.user_id = ?
+        """
+        params = [user_id]
+        if cursor:
+            last_created_at, last_id = decode_cursor(cursor)
+            query += " AND (n.created_at, n.id) < (?, ?)"
+            params.extend([last_created_at, last_id])
+        query += " ORDER BY n.created_at DESC, n.id DESC LIMIT ?"
+        params.append(limit + 1)
+        
+        db_cursor.execute(query, params)
+        notifications = db_cursor.fetchall()
+        
+        next_cursor = None
+        if len(notifications) > limit:
+            notifications = notifications[:limit]
+            next_cursor = encode_cursor(notifications[-1][4], notifications[-1][0])
         
         result = []
         for notification in notifications:
@@ -451,20 +831,44 @@ def get_notifications(user_id: int, limit: int = 50) -> List[NotificationModel]:
                 created_at=datetime.fromisoformat(notification[4]) if isinstance(notification[4], str) else notification[4]  # created_at
             ))
         
-        return result
+        return NotificationPage(items=result, next_cursor=next_cursor)
 
 def mark_notification_read(notification_id: int, user_id: int) -> dict:
     """Отметить уведомление как прочитанное"""
     with get_db() as conn:
         cursor = conn.cursor()
         
-        # Проверяем, что уведомление существует и принадлежит пользователю
-        cursor.execute("SELECT id FROM notifications WHERE id = ? AND user_id = ?", (notification_id, user_id))
-        if not cursor.fetchone():
+        # Проверка владельца входит в условие UPDATE
+        cursor.execute("UPDATE notifications SET is_read = 1 WHERE id = ? AND user_id = ?",
+                       (notification_id, user_id))
+        if cursor.rowcount == 0:
             raise ValueError("Notification not found or access denied")
+        conn.commit()
         
-        # Отмечаем как прочитанное
-        cursor.execute("UPDATE notifications SET is_read = 1 WHERE id = ?", (notification_id,))
+        return {"success": True, "message": "Notification marked as read"}
+
+def mark_notifications_read(user_id: int, notification_ids: List[int] = None) -> dict:
+    """Отметить прочитанными указанные уведомления (ids=None - все) одним запросом"""
+    if notification_ids is not None and not notification_ids:
+        # Пустой список - нечего отмечать, а не "отметить все"
+        return {"success": True, "updated": 0, "message": "Notifications marked as read"}
+    with get_db() as conn:
+        cursor = conn.cursor()
+        
+        query = "UPDATE notifications SET is_read = 1 WHERE user_id = ? AND is_read = 0"
+        params = [user_id]
+        if notification_ids is not None:
+            query += f" AND id IN ({', '.join('?' * len(notification_ids))})"
+            params.extend(notification_ids)
+        cursor.execute(query, params)
+        updated = cursor.rowcount
         conn.commit()
         
-        return {"success": True, "message": "Notification marked as read"}
\ No newline at end of file
+        return {"success": True, "updated": updated, "message": "Notifications marked as read"}
+
+def get_unread_notifications_count(user_id: int) -> int:
+    """Число непрочитанных уведомлений (по частичному индексу idx_notifications_user_unread)"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM notifications WHERE user_id = ? AND is_read = 0", (user_id,))
+        return cursor.fetchone()[0]
\ No newline at end of file
@@ -0,0 +1,198 @@
+"""Сборка статики: CSS Tailwind и сторонние библиотеки с хешем в имени.
+
+    python -m app.web.assets
+
+Результат - app/static/dist/<имя>.<хеш>.<ext> и manifest.json с
+соответствием логических имен файлам. Шаблоны получают адреса через
+asset_url(); пока сборки нет, base.html подключает те же библиотеки с CDN.
+"""
+import os
+import re
+import sys
+import json
+import shlex
+import hashlib
+import logging
+import subprocess
+import urllib.request
+from urllib.parse import urljoin, urlsplit
+from starlette.staticfiles import StaticFiles
+
+logger = logging.getLogger(__name__)
+
+ASSETS_SOURCE_DIR = "assets"
+STATIC_DIR = "app/static"
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_PATH = os.path.join(DIST_DIR, "manifest.json")
+STATIC_URL = "/static/dist/"
+# Скачанные библиотеки хранятся здесь: повторная сборка не ходит в сеть
+VENDOR_CACHE_DIR = os.path.join(ASSETS_SOURCE_DIR, "vendor")
+# Команда Tailwind CLI; можно указать standalone-бинарник
+TAILWIND_COMMAND = os.getenv("ULE_TAILWIND_COMMAND", "npx --yes tailwindcss@3.4.17")
+
+# Логическое имя -> адрес с фиксированной версией
+VENDOR_ASSETS = {
+    "alpine.js": "https://unpkg.com/alpinejs@3.14.1/dist/cdn.min.js",
+    "remixicon.css": "https://cdn.jsdelivr.net/npm/remixicon@3.5.0/fonts/remixicon.css",
+    "fontawesome.css": "https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css",
+}
+
+# Файлы с хешем в имени не меняются: их можно кешировать навсегда
+HASHED_NAME = re.compile(r"\.[0-9a-f]{16}\.[a-z0-9]+$")
+CSS_URL = re.compile(r"url\(\s*(['\"]?)([^'\")]+)\1\s*\)")
+
+def _digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+def _write_hashed(name: str, data: bytes) -> str:
+    """Записать файл в dist под именем с хешем содержимого"""
+    stem, ext = os.path.splitext(name)
+    hashed = f"{stem}.{_digest(data)}{ext}"
+    path = os.path.join(DIST_DIR, hashed)
+    if not os.path.exists(path):
+        with open(path, "wb") as f:
+            f.write(data)
+    return hashed
+
+def _fetch(url: str) -> bytes:
+    """Содержимое файла библиотеки: из кеша assets/vendor или из сети"""
+    parts = urlsplit(url)
+    cached = os.path.join(VENDOR_CACHE_DIR, parts.netloc, parts.path.lstrip("/"))
+    if os.path.exists(cached):
+        with open(cached, "rb") as f:
+            return f.read()
+    logger.info("Downloading %s", url)
+    with urllib.request.urlopen(url, timeout=30) as response:
+        data = response.read()
+    os.makedirs(os.path.dirname(cached), exist_ok=True)
+    with open(cached, "wb") as f:
+        f.write(data)
+    return data
+
+def _build_vendor_css(url: str, name: str) -> str:
+    """Скачать CSS вместе со шрифтами и переписать url() на файлы с хешем"""
+    css = _fetch(url).decode("utf-8")
+    written = {}
+
+    def replace(match):
+        quote, ref = match.groups()
+        if ref.startswith("data:"):
+            return match.group(0)
+        absolute = urljoin(url, ref)
+        parts = urlsplit(absolute)
+        resource = parts._replace(query="", fragment="").geturl()
+        if resource not in written:
+            written[resource] = _write_hashed(os.path.basename(parts.path), _fetch(resource))
+        fragment = f"#{parts.fragment}" if parts.fragment else ""
+        return f"url({quote}{written[resource]}{fragment}{quote})"
+
+    return _write_hashed(name, CSS_URL.sub(replace, css).encode("utf-8"))
+
+def _build_tailwind() -> str:
+    """Tailwind CLI: в CSS только классы из шаблонов, минифицированный"""
+    output = os.path.join(DIST_DIR, ".app.css")
+    command = shlex.split(TAILWIND_COMMAND) + [
+        "-c", os.path.join(ASSETS_SOURCE_DIR, "tailwind.config.js"),
+        "-i", os.path.join(ASSETS_SOURCE_DIR, "tailwind.css"),
+        "-o", output, "--minify",
+    ]
+    subprocess.run(command, check=True)
+    with open(output, "rb") as f:
+        data = f.read()
+    os.remove(output)
+    return _write_hashed("app.css", data)
+
+def _prune(keep: set):
+    """Удалить файлы, которые не нужны ни новой, ни предыдущей сборке.
+
+    Предыдущая сохраняется: страницы, уже открытые в браузерах (и воркеры,
+    еще не перезапущенные), ссылаются на ее файлы.
+    """
+    for name in os.listdir(DIST_DIR):
+        if HASHED_NAME.search(name) and name not in keep:
+            os.remove(os.path.join(DIST_DIR, name))
+
+def _referenced_files(manifest: dict) -> set:
+    """Файлы сборки: из манифеста и шрифты, на которые ссылаются CSS"""
+    files = set(manifest.values())
+    for name in manifest.values():
+        if name.endswith(".css"):
+            path = os.path.join(DIST_DIR, name)
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    files.update(ref.split("#")[0] for _, ref in CSS_URL.findall(f.read()))
+    return files
+
+def build_assets() -> dict:
+    """Собрать статику и записать manifest.json"""
+    os.makedirs(DIST_DIR, exist_ok=True)
+    previous = load_manifest()
+    manifest = {"app.css": _build_tailwind()}
+    for name, url in VENDOR_ASSETS.items():
+        if name.endswith(".css"):
+            manifest[name] = _build_vendor_css(url, name)
+        else:
+            manifest[name] = _write_hashed(name, _fetch(url))
+    # Манифест пишется последним и целиком: воркеры не увидят половину сборки
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, MANIFEST_PATH)
+    _prune(_referenced_files(manifest) | _referenced_files(previous))
+    return manifest
+
+def load_manifest() -> dict:
+    try:
+        with open(MANIFEST_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+class AssetManifest:
+    """Манифест сборки для шаблонов; перечитывается, если файл изменился"""
+
+    def __init__(self, path: str = MANIFEST_PATH):
+        self.path = path
+        self._mtime = None
+        self._entries = {}
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._mtime:
+            self._mtime = mtime
+            self._entries = load_manifest() if mtime is not None else {}
+
+    def url(self, name: str):
+        """Адрес файла с хешем или None, если сборки нет (шаблон берет CDN)"""
+        self._refresh()
+        hashed = self._entries.get(name)
+        return STATIC_URL + hashed if hashed else None
+
+asset_manifest = AssetManifest()
+
+def asset_url(name: str):
+    return asset_manifest.url(name)
+
+class AssetStaticFiles(StaticFiles):
+    """Статика: файлы с хешем в имени кешируются браузером навсегда"""
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if HASHED_NAME.search(os.fspath(full_path)):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        else:
+            response.headers["Cache-Control"] = "no-cache"
+        return response
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    try:
+        result = build_assets()
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.error("Asset build failed: %s", e)
+        sys.exit(1)
+    for logical, hashed in sorted(result.items()):
+        logger.info("%s -> %s", logical, hashed)
@@ -0,0 +1,129 @@
+import os
+import gzip
+import hashlib
+import logging
+from fastapi import Request, Response
+from fastapi.responses import HTMLResponse
+from fastapi.templating import Jinja2Templates
+from app.cache import is_not_modified
+from app.web.assets import asset_url, MANIFEST_PATH
+
+try:
+    import brotli
+except ImportError:
+    # brotli необязателен: без него отдаются gzip и несжатые страницы
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# В разработке страницы перерисовываются, когда меняются шаблоны или манифест статики
+TEMPLATES_RELOAD = os.getenv("ULE_TEMPLATES_RELOAD", "0") == "1"
+PAGES_CACHE_CONTROL = "no-cache"
+
+def _accepted_encodings(header: str) -> set:
+    """Кодировки из Accept-Encoding, кроме запрещенных через q=0"""
+    accepted = set()
+    for item in header.split(","):
+        name, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    pass
+        if name and quality > 0:
+            accepted.add(name.lower())
+    return accepted
+
+class PageCache:
+    """Страницы без данных пользователя, отрисованные один раз.
+
+    Шаблоны не зависят от запроса (данные грузятся из браузера через API),
+    поэтому каждая страница хранится готовыми байтами вместе со сжатыми
+    вариантами; ответ - копия из памяти с ETag для повторной проверки.
+    """
+
+    def __init__(self, directory: str, reload: bool = TEMPLATES_RELOAD, watch: tuple = ()):
+        self.directory = directory
+        self.reload = reload
+        # Файлы, изменение которых тоже требует перерисовки (манифест статики)
+        self.watch = watch
+        self.templates = Jinja2Templates(directory=directory)
+        self.templates.env.globals["asset_url"] = asset_url
+        # имя шаблона -> {кодировка: (тело, ETag)}
+        self._pages = {}
+        self._signature = self._templates_signature() if reload else None
+        self._stats = {"renders": 0, "hits": 0, "not_modified": 0, "invalidations": 0}
+
+    def _templates_signature(self) -> tuple:
+        with os.scandir(self.directory) as entries:
+            files = sorted((entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+                           for entry in entries if entry.is_file())
+        for path in self.watch:
+            try:
+                files.append((path, os.stat(path).st_mtime_ns, 0))
+            except FileNotFoundError:
+                files.append((path, None, 0))
+        return tuple(files)
+
+    def _render(self, name: str) -> dict:
+        html = self.templates.get_template(name).render().encode("utf-8")
+        digest = hashlib.blake2b(html, digest_size=12).hexdigest()
+        variants = {
+            "identity": (html, f'"{digest}"'),
+            # mtime=0: одинаковые байты (и ETag) во всех воркерах
+            "gzip": (gzip.compress(html, compresslevel=9, mtime=0), f'"{digest}-gzip"'),
+        }
+        if brotli is not None:
+            variants["br"] = (brotli.compress(html, quality=11), f'"{digest}-br"')
+        self._stats["renders"] += 1
+        return variants
+
+    def _check_templates(self):
+        signature = self._templates_signature()
+        if signature != self._signature:
+            self._signature = signature
+            self._pages.clear()
+            self._stats["invalidations"] += 1
+
+    def get(self, name: str) -> dict:
+        if self.reload:
+            self._check_templates()
+        variants = self._pages.get(name)
+        if variants is None:
+            variants = self._pages[name] = self._render(name)
+        else:
+            self._stats["hits"] += 1
+        return variants
+
+    def warm(self):
+        """Отрисовать все страницы заранее (при старте приложения)"""
+        for name in self.templates.env.list_templates(extensions=["html"]):
+            if name != "base.html":
+                self.get(name)
+        logger.info("Pages rendered", extra={"pages": len(self._pages), "brotli": brotli is not None})
+
+    def response(self, request: Request, name: str) -> Response:
+        variants = self.get(name)
+        accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+        encoding = next((candidate for candidate in ("br", "gzip") if candidate in variants and candidate in accepted),
+                        "identity")
+        body, etag = variants[encoding]
+        headers = {"ETag": etag, "Cache-Control": PAGES_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+        if is_not_modified(request, etag):
+            self._stats["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return HTMLResponse(content=body, headers=headers)
+
+    def stats(self) -> dict:
+        return {"pages": len(self._pages), "bytes": sum(len(body) for variants in self._pages.values()
+                                                        for body, _ in variants.values()),
+                "brotli": brotli is not None, "reload": self.reload, **self._stats}
+
+page_cache = PageCache("app/templates", watch=(MANIFEST_PATH,))
+
+def get_pages_stats() -> dict:
+    return page_cache.stats()
@@ -0,0 +1,9 @@
+// Конфигурация сборки CSS (python -m app.web.assets): в файл попадают
+// только классы, встречающиеся в шаблонах
+module.exports = {
+  content: ["./app/templates/**/*.html"],
+  theme: {
+    extend: {},
+  },
+  plugins: [],
+};
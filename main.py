@@ -1,19 +1,63 @@
-from fastapi import FastAPI
+import os
+import asyncio
+import logging
+import secrets
+from fastapi import FastAPI, Request, Depends, HTTPException
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.auth.api import router as auth_router
 from app.tasks.api import router as tasks_router
+from app.photos.api import router as photos_router
 from app.web.routes import router as web_router
-from app.database import create_tables
+from app.web.pages import page_cache, get_pages_stats
+from app.web.assets import AssetStaticFiles, STATIC_DIR
+from app.photos.service import migrate_legacy_photos
+from app.tasks.service import backfill_task_dates
+from app.database import create_tables, close_pool, get_pool_stats, db_executor, get_executor_stats, run_db
+from app.auth.service import get_token_cache_stats
+from app.auth.hashing import hash_executor, get_hashing_stats
+from app.logging_config import setup_logging, shutdown_logging, get_logging_stats
+from app.auth.revocation import load_revocations, revocation_sync_loop, get_revocation_stats
+from app.tasks.events import notification_hub, get_events_stats
+from app.tasks.category_index import load_category_index, category_index_loop, get_category_index_stats
+from app.jobs import job_queue, get_job_stats
+from app.cache import get_response_cache_stats
+from app.coalesce import get_coalesce_stats
+
+setup_logging()
+logger = logging.getLogger("app.main")
 
 app = FastAPI(title="ULE Platform API", version="1.0.0")
 
 @app.on_event("startup")
 async def startup_event():
-    print("🗄️ Инициализация базы данных...")
-    create_tables()
-    print("✅ База данных готова!")
+    setup_logging()
+    logger.info("Инициализация базы данных")
+    await run_db(create_tables)
+    migrated = await run_db(migrate_legacy_photos)
+    if migrated:
+        logger.info("Фотографии перенесены в хранилище для %s задач", migrated)
+    await run_db(backfill_task_dates)
+    await run_db(load_revocations)
+    app.state.revocation_sync = asyncio.create_task(revocation_sync_loop())
+    await notification_hub.start()
+    await run_db(load_category_index)
+    app.state.category_index_refresh = asyncio.create_task(category_index_loop())
+    await job_queue.start()
+    page_cache.warm()
+    logger.info("База данных готова")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.revocation_sync.cancel()
+    app.state.category_index_refresh.cancel()
+    await job_queue.stop()
+    await notification_hub.stop()
+    hash_executor.shutdown()
+    db_executor.shutdown()
+    close_pool()
+    shutdown_logging()
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,13 +65,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Estimate"],
 )
 
 templates = Jinja2Templates(directory="app/templates")
 
 app.include_router(auth_router, prefix="/api/v1/auth", tags=["Authentication"])
 app.include_router(tasks_router, prefix="/api/v1/tasks", tags=["Tasks & Services"])
+app.include_router(photos_router, prefix="/api/v1/photos", tags=["Photos"])
 app.include_router(web_router, tags=["Web Interface"])
+app.mount("/static", AssetStaticFiles(directory=STATIC_DIR, check_dir=False), name="static")
 
 @app.get("/")
 async def root():
@@ -37,6 +84,29 @@ async def root():
 async def health_check():
     return {"status": "healthy", "domain": "ylebb.ru"}
 
+# Внутренняя статистика: только запросы с самого сервера (не через nginx,
+# он добавляет X-Real-IP) или с заголовком X-Stats-Token = ULE_STATS_TOKEN
+STATS_TOKEN = os.getenv("ULE_STATS_TOKEN")
+LOCAL_HOSTS = {"127.0.0.1", "::1"}
+
+def require_internal(request: Request):
+    token = request.headers.get("x-stats-token")
+    if STATS_TOKEN and token and secrets.compare_digest(token, STATS_TOKEN):
+        return
+    proxied = "x-real-ip" in request.headers or "x-forwarded-for" in request.headers
+    if request.client and request.client.host in LOCAL_HOSTS and not proxied:
+        return
+    raise HTTPException(status_code=404, detail="Not Found")
+
+@app.get("/health/stats", dependencies=[Depends(require_internal)])
+async def health_stats():
+    return {"database": get_pool_stats(), "db_executor": get_executor_stats(),
+            "token_cache": get_token_cache_stats(), "password_hashing": get_hashing_stats(),
+            "revocation": get_revocation_stats(), "notification_events": get_events_stats(),
+            "category_index": get_category_index_stats(), "jobs": await run_db(get_job_stats),
+            "response_cache": get_response_cache_stats(), "coalesce": get_coalesce_stats(),
+            "pages": get_pages_stats(), "logging": get_logging_stats()}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
@@ -21,9 +21,15 @@ if [ ! -d "app/static" ]; then
     mkdir -p app/static
 fi
 
+# Собираем статику (CSS Tailwind, библиотеки и шрифты с хешем в имени);
+# если сборка не удалась, страницы подключат библиотеки с CDN
+echo "🎨 Собираю статику..."
+python3 -m app.web.assets || echo "⚠️ Сборка статики не удалась, используется CDN"
+
 # Запускаем приложение через uvicorn
 echo "▶️ Запускаю приложение..."
-nohup uvicorn main:app --host 127.0.0.1 --port 8000 > app.log 2>&1 &
+# SSE-соединения открыты постоянно: при остановке ждем их не дольше 10 секунд
+nohup uvicorn main:app --host 127.0.0.1 --port 8000 --timeout-graceful-shutdown 10 > app.log 2>&1 &
 
 # Сохраняем PID
 echo $! > app.pid
@@ -0,0 +1,58 @@
+"""
+Условные GET: 304 только для неизмененных ресурсов
+"""
+
+import os
+import tempfile
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+import pytest
+
+TMP_DIR = tempfile.mkdtemp()
+os.environ.setdefault("ULE_PHOTOS_DIR", os.path.join(TMP_DIR, "photos"))
+os.environ.setdefault("ULE_BCRYPT_ROUNDS", "4")
+
+import app.database as database
+
+database.DATABASE_PATH = os.path.join(TMP_DIR, "test.db")
+
+from fastapi.testclient import TestClient
+from main import app
+
+TASK = {"service_category": "movers", "description": "Перевезти шкаф на дачу",
+        "address": "Москва", "date": "2030-01-01", "price": 1000}
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        phone = "+7 999 000 00 01"
+        client.post("/api/v1/auth/register", json={"phone": phone, "password": "123456"})
+        token = client.post("/api/v1/auth/login", json={"phone": phone, "password": "123456"}).json()["token"]
+        client.headers["Authorization"] = f"Bearer {token}"
+        yield client
+
+def test_unchanged_task_is_not_modified(client):
+    task_id = client.post("/api/v1/tasks/tasks", json=TASK).json()["task_id"]
+    first = client.get(f"/api/v1/tasks/tasks/{task_id}")
+    assert first.status_code == 200
+    again = client.get(f"/api/v1/tasks/tasks/{task_id}", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+
+def test_update_within_one_second_is_not_hidden(client):
+    """Изменение в ту же секунду не меняет updated_at, но 304 быть не должно"""
+    task_id = client.post("/api/v1/tasks/tasks", json=TASK).json()["task_id"]
+    first = client.get(f"/api/v1/tasks/tasks/{task_id}")
+    # Дата, которую клиент мог получить до изменения
+    seen = first.headers.get("Last-Modified") or format_datetime(datetime.now(timezone.utc), usegmt=True)
+
+    assert client.put(f"/api/v1/tasks/tasks/{task_id}", json={"price": 2000}).status_code == 200
+
+    by_date = client.get(f"/api/v1/tasks/tasks/{task_id}", headers={"If-Modified-Since": seen})
+    assert by_date.status_code == 200
+    assert by_date.json()["price"] == 2000
+
+    by_etag = client.get(f"/api/v1/tasks/tasks/{task_id}", headers={"If-None-Match": first.headers["ETag"],
+                                                                      "If-Modified-Since": seen})
+    assert by_etag.status_code == 200
+    assert by_etag.json()["price"] == 2000